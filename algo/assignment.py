@@ -0,0 +1,108 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+from scipy.optimize import linprog
+from scipy.sparse import coo_matrix, csr_matrix
+
+
+class BalancedAssignment(object):
+    """
+    Capacity-constrained assignment of base stations to edge servers.
+
+    Minimizes the total base station - edge server distance subject to a workload capacity per edge server.
+    The transportation LP is built on a sparse graph that only links each base station to its `neighbors`
+    nearest edge servers and is solved by HiGHS. A basic optimal solution splits at most one base station per
+    binding capacity, those are rounded heaviest first to the closest edge server with room left, so a capacity is
+    only exceeded when a base station fits nowhere (reported as overflow).
+    """
+
+    def __init__(self, neighbors=10, capacity_slack=1.1):
+        self.neighbors = neighbors
+        self.capacity_slack = capacity_slack
+        self.overflow = 0
+        self.fractional = 0
+
+    def capacities(self, workloads: np.ndarray, edge_server_num) -> np.ndarray:
+        """
+        Default capacities: the average workload per edge server times capacity_slack
+        """
+        return np.full(edge_server_num, self.capacity_slack * np.sum(workloads) / edge_server_num)
+
+    def assign(self, distances: np.ndarray, workloads, capacities=None) -> np.ndarray:
+        """
+        Assign base stations to edge servers
+
+        :param distances: distance(km) matrix of shape (base stations, edge servers)
+        :param workloads: workload of each base station
+        :param capacities: workload capacity of each edge server (scalar or array), see capacities() by default
+        :return: index of the assigned edge server for each base station
+        """
+        n, k = distances.shape
+        workloads = np.asarray(workloads, dtype=float)
+        if capacities is None:
+            capacities = self.capacities(workloads, k)
+        capacities = np.broadcast_to(np.asarray(capacities, dtype=float), (k,))
+        if capacities.sum() < workloads.sum():
+            raise ValueError("Total capacity {0} is below total workload {1}".format(capacities.sum(),
+                                                                                     workloads.sum()))
+
+        neighbors = min(self.neighbors, k)
+        while True:
+            logging.debug("{0}: Balanced assignment with N={1}, K={2}, neighbors={3}".format(
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'), n, k, neighbors))
+            result, rows, cols = self._solve(distances, workloads, capacities, neighbors)
+            if result.status == 0 or neighbors == k:
+                break
+            # sparse graph too thin to satisfy the capacities, widen it
+            neighbors = min(neighbors * 2, k)
+        if result.status != 0:
+            raise ValueError("Balanced assignment failed: {0}".format(result.message))
+
+        x = csr_matrix((result.x, (rows, cols)), shape=(n, k))
+        labels = np.asarray(x.argmax(axis=1)).ravel()
+        split = np.flatnonzero(x.max(axis=1).toarray().ravel() < 1 - 1e-6)
+        self.fractional = len(split)
+        labels = self._round(distances, workloads, capacities, labels, split, x)
+        loads = np.bincount(labels, weights=workloads, minlength=k)
+        self.overflow = float(np.maximum(loads - capacities, 0).sum())
+        return labels
+
+    @staticmethod
+    def _round(distances, workloads, capacities, labels, split, x):
+        """
+        Round split base stations, heaviest first, to the closest edge server with room left (preferring their LP
+        support), or to the support edge server with the most room left
+        """
+        whole = np.ones(len(labels), dtype=bool)
+        whole[split] = False
+        residual = capacities - np.bincount(labels[whole], weights=workloads[whole], minlength=len(capacities))
+        for i in split[np.argsort(-workloads[split], kind='stable')]:
+            support = x.indices[x.indptr[i]:x.indptr[i + 1]][x.data[x.indptr[i]:x.indptr[i + 1]] > 1e-9]
+            fits = support[residual[support] >= workloads[i]]
+            if not len(fits):
+                fits = np.flatnonzero(residual >= workloads[i])
+            if len(fits):
+                labels[i] = fits[np.argmin(distances[i, fits])]
+            else:
+                labels[i] = support[np.argmax(residual[support])]
+            residual[labels[i]] -= workloads[i]
+        return labels
+
+    @staticmethod
+    def _solve(distances, workloads, capacities, neighbors):
+        n, k = distances.shape
+        if neighbors < k:
+            nearest = np.argpartition(distances, neighbors - 1, axis=1)[:, :neighbors]
+        else:
+            nearest = np.tile(np.arange(k), (n, 1))
+        rows = np.repeat(np.arange(n), nearest.shape[1])
+        cols = nearest.ravel()
+        edges = np.arange(len(rows))
+
+        # every base station is fully assigned, every edge server stays within capacity
+        a_eq = coo_matrix((np.ones(len(rows)), (rows, edges)), shape=(n, len(rows))).tocsr()
+        a_ub = coo_matrix((workloads[rows], (cols, edges)), shape=(k, len(rows))).tocsr()
+        result = linprog(distances[rows, cols], A_ub=a_ub, b_ub=capacities, A_eq=a_eq, b_eq=np.ones(n),
+                         bounds=(0, 1), method='highs')
+        return result, rows, cols
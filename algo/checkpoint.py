@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+class Checkpoint(object):
+    """
+    Periodic checkpoint of a metaheuristic search state in a single .npz file.
+
+    Arrays are stored as they are; everything else (iteration counters, RNG states, the settings the run was
+    started with) goes into one JSON entry. The file is written to a temporary path and renamed, so a pre-empted
+    write never leaves a broken checkpoint behind. The file name carries the run key (e.g. N, K and seed), so runs
+    of a sweep sharing one path do not collide, and the file is removed once the run has finished.
+    """
+
+    def __init__(self, path, every=10, key: dict = None):
+        """
+        :param path: checkpoint file, no checkpoints if None
+        :param key: run settings appended to the file name, e.g. {'n': 3000, 'k': 100, 'seed': 0}
+        """
+        if path is not None and key:
+            root, ext = os.path.splitext(path)
+            path = '{0}_{1}{2}'.format(root, '_'.join('{0}{1}'.format(name, value) for name, value in key.items()),
+                                       ext or '.npz')
+        self.path = path
+        self.every = every
+        self.last_saved = None
+        self.saves = 0
+        self.overhead = 0.0
+
+    def exists(self):
+        return self.path is not None and os.path.exists(self.path)
+
+    def due(self, iteration):
+        """
+        Whether at least `every` iterations passed since the last save
+        """
+        if self.path is None:
+            return False
+        if self.last_saved is None:
+            self.last_saved = 0
+        return iteration - self.last_saved >= self.every
+
+    def save(self, iteration, arrays: dict, meta: dict):
+        start = time.perf_counter()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp_path, self.path)
+        self.last_saved = iteration
+        self.saves += 1
+        self.overhead += time.perf_counter() - start
+        logging.debug("{0}: Saved checkpoint {1} at iteration {2}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.path, iteration))
+
+    def load(self, settings: dict):
+        """
+        :param settings: settings of the current run, must match the ones saved with the checkpoint
+        :return: arrays and meta of the checkpoint
+        """
+        start = time.perf_counter()
+        with np.load(self.path) as data:
+            meta = json.loads(str(data['__meta__']))
+            arrays = {key: data[key] for key in data.files if key != '__meta__'}
+        if meta.get('settings') != settings:
+            raise ValueError("Checkpoint {0} was written with settings {1}, current settings are {2}".format(
+                self.path, meta.get('settings'), settings))
+        self.last_saved = meta['iteration']
+        self.overhead += time.perf_counter() - start
+        logging.info("{0}: Resuming from checkpoint {1} at iteration {2}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.path, meta['iteration']))
+        return arrays, meta
+
+    def finish(self):
+        """
+        Remove the checkpoint of a finished run, so a rerun starts over instead of resuming it
+        """
+        if self.path is None:
+            return
+        for path in (self.path, self.path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def report(self) -> dict:
+        return {'checkpoints': self.saves, 'checkpoint_overhead': self.overhead}
+
+    @staticmethod
+    def rng_state(rng: np.random.Generator) -> dict:
+        return rng.bit_generator.state
+
+    @staticmethod
+    def restore_rng(state: dict) -> np.random.Generator:
+        bit_generator = getattr(np.random, state['bit_generator'])()
+        bit_generator.state = state
+        return np.random.Generator(bit_generator)
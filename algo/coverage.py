@@ -0,0 +1,182 @@
+import numpy as np
+from scipy import sparse
+
+try:
+    _popcount = np.bitwise_count
+except AttributeError:  # numpy < 2.0
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values):
+        return _POPCOUNT_TABLE[values]
+
+
+class CoverageIndex(object):
+    """
+    Precomputed coverage of base stations within a distance radius.
+
+    For every candidate site the base stations within `radius` km are stored twice: as a packed bitset (one bit per
+    base station) for fast unions and popcounts of whole site sets, and as an index list for incremental updates
+    (see CoverageState).
+    """
+
+    def __init__(self, distances: np.ndarray, workloads, radius, block=1024):
+        """
+        :param distances: distance(km) matrix of shape (candidate sites, base stations)
+        :param workloads: workload of each base station
+        :param radius: coverage radius(km)
+        """
+        self.radius = radius
+        self._build((distances[i:i + block] <= radius for i in range(0, len(distances), block)),
+                    distances.shape, workloads)
+
+    @classmethod
+    def from_members(cls, members, workloads, block=1024):
+        """
+        Coverage index of explicit neighborhoods (e.g. the nearest base stations of every site) instead of a radius
+
+        :param members: sparse matrix of shape (candidate sites, base stations), nonzero if the site covers the station
+        :param workloads: workload of each base station
+        """
+        index = cls.__new__(cls)
+        index.radius = None
+        members = members.tocsr()
+        index._build((members[i:i + block].toarray() != 0 for i in range(0, members.shape[0], block)),
+                     members.shape, workloads)
+        return index
+
+    def _build(self, blocks, shape, workloads):
+        self.workloads = np.asarray(workloads, dtype=float)
+        self.site_num, self.base_station_num = shape
+        bits, indptr, indices = [], [0], []
+        for within in blocks:
+            bits.append(np.packbits(within, axis=1))
+            rows, cols = np.nonzero(within)
+            indptr.extend(indptr[-1] + np.cumsum(np.bincount(rows, minlength=len(within))))
+            indices.append(cols)
+        self.bits = np.concatenate(bits)
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.concatenate(indices)
+        self._matrix = None
+
+    def matrix(self) -> sparse.csr_matrix:
+        """
+        Coverage as sparse matrix of shape (candidate sites, base stations)
+        """
+        if self._matrix is None:
+            self._matrix = sparse.csr_matrix((np.ones(len(self.indices)), self.indices, self.indptr),
+                                             shape=(self.site_num, self.base_station_num))
+        return self._matrix
+
+    def covered(self, sites) -> np.ndarray:
+        """
+        Packed bitset of the base stations covered by a site set
+        """
+        sites = np.asarray(sites, dtype=int)
+        if len(sites) == 0:
+            return np.zeros(self.bits.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bits[sites], axis=0)
+
+    def count(self, sites) -> int:
+        """
+        Number of base stations covered by a site set
+        """
+        return int(_popcount(self.covered(sites)).sum())
+
+    def workload(self, sites) -> float:
+        """
+        Workload of the base stations covered by a site set
+        """
+        mask = np.unpackbits(self.covered(sites), count=self.base_station_num).astype(bool)
+        return float(self.workloads[mask].sum())
+
+    def count_many(self, site_sets: np.ndarray) -> np.ndarray:
+        """
+        Number of covered base stations for a batch of equally sized site sets
+
+        :param site_sets: site indices of shape (sets, sites per set)
+        """
+        union = np.bitwise_or.reduce(self.bits[site_sets], axis=1)
+        return _popcount(union).sum(axis=1, dtype=np.int64)
+
+    def workload_many(self, site_sets: np.ndarray) -> np.ndarray:
+        """
+        Covered workload for a batch of equally sized site sets
+
+        :param site_sets: site indices of shape (sets, sites per set)
+        """
+        union = np.bitwise_or.reduce(self.bits[site_sets], axis=1)
+        mask = np.unpackbits(union, axis=1, count=self.base_station_num)
+        return mask @ self.workloads
+
+    def covered_masks(self, site_sets: np.ndarray, columns=None) -> np.ndarray:
+        """
+        Covered base stations of a batch of equally sized site sets as boolean rows
+
+        :param site_sets: site indices of shape (sets, sites per set)
+        :param columns: only these base stations (e.g. a sample), all by default
+        """
+        union = np.bitwise_or.reduce(self.bits[site_sets], axis=1)
+        mask = np.unpackbits(union, axis=1, count=self.base_station_num).astype(bool)
+        return mask if columns is None else mask[:, columns]
+
+    def members(self, site) -> np.ndarray:
+        """
+        Base stations within radius of one site
+        """
+        return self.indices[self.indptr[site]:self.indptr[site + 1]]
+
+
+class CoverageState(object):
+    """
+    Coverage of a site set that is changed one site at a time.
+    Keeps how many open sites cover each base station, so adding or removing a site only touches its own members.
+    """
+
+    def __init__(self, index: CoverageIndex, sites=()):
+        self.index = index
+        self.cover_counts = np.zeros(index.base_station_num, dtype=np.int32)
+        self.sites = set()
+        self.count = 0
+        self.workload = 0.0
+        for site in sites:
+            self.add(site)
+
+    def add(self, site):
+        if site in self.sites:
+            return
+        self.sites.add(site)
+        members = self.index.members(site)
+        self.cover_counts[members] += 1
+        newly = members[self.cover_counts[members] == 1]
+        self.count += len(newly)
+        self.workload += self.index.workloads[newly].sum()
+
+    def remove(self, site):
+        if site not in self.sites:
+            return
+        self.sites.remove(site)
+        members = self.index.members(site)
+        self.cover_counts[members] -= 1
+        lost = members[self.cover_counts[members] == 0]
+        self.count -= len(lost)
+        self.workload -= self.index.workloads[lost].sum()
+
+    def gain(self, site) -> int:
+        """
+        Number of base stations that adding the site would newly cover
+        """
+        members = self.index.members(site)
+        return int(np.count_nonzero(self.cover_counts[members] == 0))
+
+    def gains(self) -> np.ndarray:
+        """
+        Number of base stations that adding each candidate site would newly cover
+        """
+        return self.index.matrix() @ (self.cover_counts == 0).astype(float)
+
+    def loss(self, site) -> int:
+        """
+        Number of base stations that removing the site would uncover
+        """
+        members = self.index.members(site)
+        return int(np.count_nonzero(self.cover_counts[members] == 1))
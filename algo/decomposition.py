@@ -0,0 +1,151 @@
+import logging
+import os
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from typing import List
+
+import numpy as np
+
+from data.base_station import BaseStation
+from data.edge_server import EdgeServer
+from .mip import MIPServerPlacer
+from .server_placer import ServerPlacer
+
+
+class DecompositionServerPlacer(ServerPlacer):
+    """
+    Spatial decomposition for the exact placers on large instances.
+
+    The service area is split into regions of similar total workload by recursive bisection of the coordinates
+    (always along the wider axis, at the workload-weighted median), K is allocated across regions in proportion
+    to their workload (largest remainder, at least one server per region) and every regional subproblem is
+    solved by MIPServerPlacer in a worker process. Every base station is finally assigned to its nearest edge
+    server over all regions, which reconciles stations near region boundaries. Wall time is bounded by the
+    largest region rather than by N.
+    """
+    name = 'Decomposition'
+
+    def __init__(self, base_stations: List[BaseStation], distances: List[List[float]], region_size=500,
+                 processes=None, **mip_params):
+        """
+        :param region_size: target number of base stations per region, sets the number of regions
+        :param processes: worker processes, one per core by default
+        :param mip_params: MIPServerPlacer arguments of the regional solves (backend, time_limit, mip_gap)
+        """
+        super().__init__(base_stations, distances)
+        self.region_size = region_size
+        self.processes = processes
+        self.mip_params = mip_params
+        self.regions = None
+
+    def place_server(self, base_station_num, edge_server_num):
+        logging.info("{0}: Start running Decomposition with N={1}, K={2}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), base_station_num, edge_server_num))
+        start = time.perf_counter()
+        base_stations = self.base_stations[:base_station_num]
+        coordinates = np.array([(bs.latitude, bs.longitude) for bs in base_stations])
+        workloads = np.array([bs.workload for bs in base_stations], dtype=float)
+
+        parts = max(1, min(edge_server_num, int(np.ceil(len(base_stations) / self.region_size))))
+        self.regions = self.bisect(coordinates, workloads, np.arange(len(base_stations)), parts)
+        budgets = self.allocate(np.array([workloads[region].sum() for region in self.regions]),
+                                np.array([len(region) for region in self.regions]), edge_server_num)
+
+        distance_matrix = self._distance_matrix()
+        tasks = [(_local_base_stations(base_stations, region), distance_matrix[np.ix_(region, region)], k,
+                  self.mip_params) for region, k in zip(self.regions, budgets)]
+        with Pool(self.processes or min(len(tasks), os.cpu_count() or 1)) as pool:
+            results = pool.starmap(_solve_region, tasks)
+
+        sites = np.concatenate([region[local] for region, (local, _) in zip(self.regions, results)])
+        edge_servers = [EdgeServer(i, base_stations[x].latitude, base_stations[x].longitude, base_stations[x].id)
+                        for i, x in enumerate(np.sort(sites))]
+        self._assign_nearest(base_stations, edge_servers)
+        self.edge_servers = edge_servers
+
+        region_times = [info['build_time'] + info['solve_time'] for _, info in results]
+        self.run_info = {'regions': len(self.regions), 'max_region_size': max(len(r) for r in self.regions),
+                         'max_region_time': max(region_times), 'total_region_time': sum(region_times),
+                         'failed_regions': sum(info['mip_objective'] is None or not np.isfinite(info['mip_objective'])
+                                               for _, info in results),
+                         'decomposition_time': time.perf_counter() - start}
+        logging.info("{0}: End running Decomposition ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                                   self.run_info))
+
+    @staticmethod
+    def bisect(coordinates, workloads, indices, parts) -> List[np.ndarray]:
+        """
+        Recursive bisection into `parts` regions of similar workload.
+
+        :param coordinates: (latitude, longitude) of all base stations
+        :param indices: base stations to split
+        :return: base station indices of every region
+        """
+        if parts == 1 or len(indices) < 2:
+            return [indices]
+        points = coordinates[indices]
+        spread = points.max(axis=0) - points.min(axis=0)
+        spread[1] *= np.cos(np.radians(points[:, 0].mean()))  # longitude degrees are shorter away from the equator
+        order = indices[np.argsort(points[:, spread.argmax()], kind='stable')]
+
+        left_parts = parts // 2
+        weights = workloads[order] + 1e-9  # stations without workload still take up room
+        cumulative = np.cumsum(weights)
+        split = int(np.searchsorted(cumulative, cumulative[-1] * left_parts / parts)) + 1
+        split = min(max(split, 1), len(order) - 1)
+        return (DecompositionServerPlacer.bisect(coordinates, workloads, order[:split], left_parts) +
+                DecompositionServerPlacer.bisect(coordinates, workloads, order[split:], parts - left_parts))
+
+    @staticmethod
+    def allocate(region_workloads, region_sizes, k) -> np.ndarray:
+        """
+        Split k servers across regions in proportion to workload by largest remainder, every region gets at least
+        one and at most as many servers as it has base stations.
+        """
+        total = region_workloads.sum()
+        shares = region_workloads / total * k if total else region_sizes / region_sizes.sum() * k
+        budgets = np.clip(np.floor(shares).astype(int), 1, region_sizes)
+        remainders = shares - budgets
+        while budgets.sum() != k:
+            if budgets.sum() < k:
+                candidates = np.flatnonzero(budgets < region_sizes)
+                region = candidates[remainders[candidates].argmax()]
+                budgets[region] += 1
+                remainders[region] -= 1
+            else:
+                candidates = np.flatnonzero(budgets > 1)
+                region = candidates[remainders[candidates].argmin()]
+                budgets[region] -= 1
+                remainders[region] += 1
+        return budgets
+
+
+def _local_base_stations(base_stations, region) -> List[BaseStation]:
+    """
+    Copies of the region's base stations with local ids, so they index the regional distance matrix.
+    """
+    local = []
+    for i, x in enumerate(region):
+        bs = BaseStation(i, base_stations[x].address, base_stations[x].latitude, base_stations[x].longitude)
+        bs.num_users = base_stations[x].num_users
+        bs.workload = base_stations[x].workload
+        local.append(bs)
+    return local
+
+
+def _solve_region(base_stations, distances, k, mip_params):
+    """
+    Solve one region with MIPServerPlacer, the k highest workload stations are used if it finds no placement.
+
+    :return: local indices of the selected sites and the solver run_info
+    """
+    placer = MIPServerPlacer(base_stations, distances, **mip_params)
+    placer.place_server(len(base_stations), k)
+    if placer.edge_servers:
+        sites = np.array([es.base_station_id for es in placer.edge_servers], dtype=int)
+    else:
+        logging.warning("No MIP solution for a region of {0} base stations, using its top-{1} workloads".format(
+            len(base_stations), k))
+        sites = np.argsort([-bs.workload for bs in base_stations], kind='stable')[:k]
+    return sites, placer.run_info
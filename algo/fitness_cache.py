@@ -0,0 +1,89 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class FitnessCache(object):
+    """
+    Bounded LRU cache of objective values for metaheuristic placers.
+
+    Solutions are keyed by a hash of their canonical form: a site set is sorted first, so every particle or
+    individual that projects onto the same sites shares one entry. Ordered solutions (e.g. an assignment vector)
+    are hashed as they are.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(solution, ordered=False) -> bytes:
+        """
+        Canonical hash of a solution
+
+        :param solution: selected site indices (any order), or an ordered vector when ordered=True
+        """
+        values = np.asarray(solution, dtype=np.int64)
+        if not ordered:
+            values = np.sort(values)
+        return hashlib.blake2b(values.tobytes(), digest_size=16).digest()
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def evaluate(self, solutions: np.ndarray, evaluate, ordered=False) -> np.ndarray:
+        """
+        Objective values of a batch of solutions, only the cache misses are passed to evaluate (once each)
+
+        :param solutions: one solution per row
+        :param evaluate: batched objective function, rows in -> values out
+        """
+        keys = [self.key(solution, ordered) for solution in solutions]
+        values = np.empty(len(solutions))
+        missing = {}
+        for row, key in enumerate(keys):
+            if key in missing:
+                # repeated within the batch, evaluated once
+                self.hits += 1
+                missing[key].append(row)
+                continue
+            value = self.get(key)
+            if value is None:
+                missing.setdefault(key, []).append(row)
+            else:
+                values[row] = value
+        if missing:
+            rows = [group[0] for group in missing.values()]
+            for key, value in zip(missing, evaluate(solutions[rows])):
+                values[missing[key]] = value
+                self.put(key, value)
+        return values
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {'cache_size': len(self.entries), 'cache_hits': self.hits, 'cache_misses': self.misses,
+                'cache_hit_rate': self.hit_rate}
@@ -2,147 +2,204 @@ import logging
 import numpy as np
 from datetime import datetime
 from typing import List, Dict
+from .checkpoint import Checkpoint
+from .fitness_cache import FitnessCache
 from .server_placer import ServerPlacer
+from .stopping import StoppingCriterion
+from .surrogate import SurrogateSample
 from data.edge_server import EdgeServer
 
 class GAServerPlacer(ServerPlacer):
     """
     Genetic Algorithm (GA) approach for edge server placement.
     This approach optimizes workload balancing and communication delay minimization simultaneously.
+
+    An individual is a set of K candidate base stations (site indices), every base station is served by the
+    closest site of the set. Selection, crossover and mutation work on the whole population as arrays, driven by
+    a seeded numpy Generator, and the elite_size best individuals survive unchanged.
     """
     name = 'GA'
 
-    def __init__(self, base_stations, distances, population_size=30, max_generations=100, mutation_rate=0.1, crossover_rate=0.9):
+    def __init__(self, base_stations, distances, population_size=30, max_generations=100, mutation_rate=0.1, crossover_rate=0.9,
+                 cache_size=10000, time_budget=None, stagnation_generations=None, stagnation_epsilon=0.0,
+                 checkpoint_path=None, checkpoint_every=10, seed=None, elite_size=2, tournament_size=2,
+                 max_batch_elements=2 ** 25, surrogate_fraction=None, surrogate_strata=10, surrogate_every=10):
         super().__init__(base_stations, distances)
         self.population_size = population_size
         self.max_generations = max_generations
         self.mutation_rate = mutation_rate
         self.crossover_rate = crossover_rate
+        self.elite_size = elite_size
+        self.tournament_size = tournament_size
+        self.seed = seed
+        self.rng = None
+        self.max_batch_elements = max_batch_elements  # gathered distances per batch of fitness evaluation
         self.num_base_stations = len(base_stations)
-        self.num_edge_servers = len(distances)
-        
-        # Initialize population: random placements of base stations on edge servers
-        self.population = np.random.rand(self.population_size, self.num_base_stations)
+        self.num_edge_servers = None
+        self.workloads = np.array([bs.workload for bs in base_stations], dtype=float)
+        self.distance_matrix = None
+
+        # Population: one row of K site indices per individual, initialized in place_server
+        self.population = None
         self.fitness_values = np.inf * np.ones(self.population_size)  # Fitness for each individual
-        
+
         # Define weight factors for objectives
         self.alpha = 0.5  # Weight factor for workload balancing
         self.beta = 0.5   # Weight factor for communication delay minimization
 
-    def compute_objectives(self):
-        """
-        Compute the objectives for workload balancing and communication delay minimization.
-        """
-        workload_balances = []
-        communication_delays = []
-
-        for i in range(self.population_size):
-            individual = self.population[i]
+        # Anytime mode: wall-clock budget (seconds) and stop after stagnation_generations without improvement > epsilon
+        self.time_budget = time_budget
+        self.stagnation_generations = stagnation_generations
+        self.stagnation_epsilon = stagnation_epsilon
+        self.stopping = None
+        self.best_individual = None
+        self.best_fitness = np.inf
 
-            # Calculate workload balance and communication delay
-            workload_balance = self._calculate_workload_balance(individual)
-            communication_delay = self._calculate_communication_delay(individual)
+        # Checkpoint the search state every checkpoint_every generations, a run with the same path resumes from it
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint = None
 
-            # Append to lists
-            workload_balances.append(workload_balance)
-            communication_delays.append(communication_delay)
+        # Fitness of already seen site sets (0 disables the cache)
+        self.fitness_cache = FitnessCache(cache_size) if cache_size else None
 
-        return np.array(workload_balances), np.array(communication_delays)
+        # Surrogate mode: score individuals on a workload-stratified sample of base stations growing from
+        # surrogate_fraction to all of them, the best individual is re-scored exactly every surrogate_every generations
+        self.surrogate_fraction = surrogate_fraction
+        self.surrogate_strata = surrogate_strata
+        self.surrogate_every = surrogate_every
+        self.surrogate = None
 
-    def _calculate_workload_balance(self, individual):
+    def compute_population_objectives(self, population=None, exact=False):
         """
-        Compute the workload balance objective for the current individual.
+        Compute the objectives for workload balancing and communication delay minimization of every individual
+        in one vectorized pass. In surrogate mode only the sampled base stations are scored, scaled by their
+        sample weights, unless exact is set.
+
+        :param population: site indices per individual, the current population by default
+        :param exact: ignore the surrogate sample
+        :return: workload balances and communication delays
         """
-        total_workload = np.sum([bs.workload for bs in self.base_stations])
-        edge_server_workloads = np.zeros(self.num_edge_servers)
+        if population is None:
+            population = self.population
+        count, k = population.shape
+        workload_balances = np.empty(count)
+        communication_delays = np.empty(count)
+        columns, workloads = None, self.workloads
+        if self.surrogate is not None and not exact:
+            columns = self.surrogate.rows
+            workloads = self.workloads[columns] * self.surrogate.weights
 
-        # Assign base stations to edge servers based on individual (placement) and calculate workloads
-        for i, base_station in enumerate(self.base_stations):
-            closest_edge_server_idx = int(individual[i] * self.num_edge_servers)
-            edge_server_workloads[closest_edge_server_idx] += base_station.workload
+        for start, nearest, min_distance in self._nearest_sites(self.distance_matrix, population,
+                                                                self.max_batch_elements, columns):
+            rows = slice(start, start + len(nearest))
+            # Scatter-add workloads by the serving site, one block of sites per individual
+            offsets = np.arange(len(nearest))[:, None] * k
+            edge_server_workloads = np.bincount((nearest + offsets).ravel(),
+                                                weights=np.tile(workloads, len(nearest)),
+                                                minlength=len(nearest) * k).reshape(len(nearest), k)
+            workload_balances[rows] = edge_server_workloads.max(axis=1) - edge_server_workloads.min(axis=1)
+            communication_delays[rows] = min_distance @ workloads
 
-        # Normalize workloads and compute the balance metric
-        max_workload = np.max(edge_server_workloads)
-        min_workload = np.min(edge_server_workloads)
-        balance = max_workload - min_workload  # Smaller value is better
+        return workload_balances, communication_delays
 
-        return balance
+    def _population_fitness(self, population, exact=False):
+        workload_balance, communication_delay = self.compute_population_objectives(population, exact)
+        return self.alpha * workload_balance + self.beta * communication_delay
 
-    def _calculate_communication_delay(self, individual):
+    def _fitness_function(self, i):
         """
-        Compute the communication delay objective for the current individual.
+        Compute the fitness value for an individual.
         """
-        delay = 0
-        for i, base_station in enumerate(self.base_stations):
-            closest_edge_server_idx = int(individual[i] * self.num_edge_servers)
-            delay += self.distances[i][closest_edge_server_idx] * base_station.workload
-        
-        return delay
+        return self._population_fitness(self.population[i:i + 1])[0]
 
-    def _fitness_function(self, i):
+    def _random_sites(self, count):
         """
-        Compute the fitness value for an individual.
+        count random individuals of K distinct sites.
+        """
+        keys = self.rng.random((count, self.num_base_stations))
+        return np.argpartition(keys, self.num_edge_servers - 1, axis=1)[:, :self.num_edge_servers]
+
+    def _membership(self, population):
+        """
+        Boolean matrix (individuals x candidate sites) of the sites each individual holds.
         """
-        workload_balance, communication_delay = self.compute_objectives()
-        fitness = self.alpha * workload_balance[i] + self.beta * communication_delay[i]
-        return fitness
+        membership = np.zeros((len(population), self.num_base_stations), dtype=bool)
+        np.put_along_axis(membership, population, True, axis=1)
+        return membership
 
     def selection(self):
         """
-        Tournament selection for selecting parents based on fitness.
+        Tournament selection: the fittest of tournament_size random individuals becomes a parent.
         """
-        selected_parents = []
-        for _ in range(self.population_size):
-            # Tournament selection: pick two random individuals, select the best one
-            tournament = np.random.choice(self.population_size, 2, replace=False)
-            winner = tournament[0] if self.fitness_values[tournament[0]] < self.fitness_values[tournament[1]] else tournament[1]
-            selected_parents.append(self.population[winner])
-        return np.array(selected_parents)
+        tournaments = self.rng.integers(self.population_size, size=(self.population_size, self.tournament_size))
+        winners = tournaments[np.arange(self.population_size), self.fitness_values[tournaments].argmin(axis=1)]
+        return self.population[winners]
 
     def crossover(self, parents):
         """
-        One-point crossover between pairs of parents to produce offspring.
-        """
-        offspring = np.empty_like(parents)
-        for i in range(0, self.population_size, 2):
-            if np.random.rand() < self.crossover_rate:
-                crossover_point = np.random.randint(1, self.num_base_stations)
-                offspring[i, :crossover_point] = parents[i, :crossover_point]
-                offspring[i+1, crossover_point:] = parents[i+1, crossover_point:]
-                offspring[i+1, :crossover_point] = parents[i+1, :crossover_point]
-                offspring[i, crossover_point:] = parents[i, crossover_point:]
-            else:
-                offspring[i] = parents[i]
-                offspring[i+1] = parents[i+1]
+        Set crossover with repair between pairs of parents. A child keeps every site both parents share and fills
+        the remaining slots with random sites from the union, so it always holds exactly K distinct sites.
+        """
+        offspring = parents.copy()
+        pairs = len(parents) // 2
+        first, second = parents[0:2 * pairs:2], parents[1:2 * pairs:2]
+        crossed = np.flatnonzero(self.rng.random(pairs) < self.crossover_rate)
+        if not len(crossed):
+            return offspring
+
+        shared = (self._membership(first[crossed]).astype(float) + self._membership(second[crossed]))
+        for child in range(2):
+            # shared sites score >= 2, sites of one parent in [1, 2), all others < 1
+            keys = shared + self.rng.random(shared.shape)
+            sites = np.argpartition(-keys, self.num_edge_servers - 1, axis=1)[:, :self.num_edge_servers]
+            offspring[2 * crossed + child] = sites
         return offspring
 
     def mutation(self, offspring):
         """
-        Mutation: Randomly change positions with a certain probability (mutation_rate).
-        Ensures mutation point is within bounds of the individual array.
+        Mutation: with probability mutation_rate an individual swaps one random site for a random site it does not
+        hold yet.
         """
-        for i in range(self.population_size):
-            if np.random.rand() < self.mutation_rate:
-                mutation_point = np.random.randint(self.num_base_stations)  # Ensure it stays within bounds
-                # mutation_point = np.random.choice(self.num_base_stations)  # Selects an index within valid range
-                print(f"Mutation Point: {mutation_point} (valid range: 0 to {self.num_base_stations - 1})")  # Debug
-                offspring[i, mutation_point] = np.random.rand()  # Randomly change the position
+        mutated = np.flatnonzero(self.rng.random(len(offspring)) < self.mutation_rate)
+        if not len(mutated):
+            return offspring
+        membership = self._membership(offspring[mutated])
+        # random key per candidate site, sites already held are pushed behind all others
+        keys = self.rng.random(membership.shape) + membership
+        new_sites = keys.argmin(axis=1)
+        positions = self.rng.integers(self.num_edge_servers, size=len(mutated))
+        offspring[mutated, positions] = new_sites
         return offspring
 
     def replace_population(self, offspring):
         """
-        Replace the current population with the offspring.
+        Replace the current population with the offspring, the elites of the current population are kept.
         """
+        if self.elite_size:
+            elites = np.argsort(self.fitness_values, kind='stable')[:self.elite_size]
+            offspring[:len(elites)] = self.population[elites]
         self.population = offspring
 
-    def update_population(self):
+    def evaluate_population(self):
         """
-        Update the population by evaluating fitness, selecting parents, performing crossover and mutation, and replacing the old population.
+        Evaluate fitness for the whole population at once, site sets seen before hit the cache.
         """
-        # Evaluate fitness for the current population
-        for i in range(self.population_size):
-            self.fitness_values[i] = self._fitness_function(i)
+        if self.fitness_cache is None:
+            self.fitness_values = self._population_fitness(self.population)
+        else:
+            self.fitness_values = self.fitness_cache.evaluate(self.population, self._population_fitness)
+
+        # Keep the best individual found so far
+        best_idx = np.argmin(self.fitness_values)
+        if self.fitness_values[best_idx] < self.best_fitness:
+            self.best_fitness = self.fitness_values[best_idx]
+            self.best_individual = self.population[best_idx].copy()
 
+    def update_population(self):
+        """
+        Update the population by selecting parents, performing crossover and mutation, keeping the elites and evaluating the new population.
+        """
         # Selection
         selected_parents = self.selection()
 
@@ -154,6 +211,96 @@ class GAServerPlacer(ServerPlacer):
 
         # Replace population with offspring
         self.replace_population(offspring)
+        self.evaluate_population()
+
+    def checkpoint_settings(self):
+        """
+        Settings that must match for a checkpoint to be resumed.
+        """
+        return {'population_size': self.population_size, 'num_base_stations': self.num_base_stations,
+                'num_edge_servers': self.num_edge_servers, 'mutation_rate': self.mutation_rate,
+                'crossover_rate': self.crossover_rate, 'alpha': self.alpha, 'beta': self.beta, 'seed': self.seed,
+                'elite_size': self.elite_size, 'tournament_size': self.tournament_size,
+                'surrogate_fraction': self.surrogate_fraction}
+
+    def save_checkpoint(self, generation):
+        """
+        Save population, best individual, fitness values, the random generator state and the generation counter.
+        """
+        arrays = {'population': self.population, 'fitness_values': self.fitness_values,
+                  'best_individual': self.best_individual}
+        meta = {'iteration': generation, 'settings': self.checkpoint_settings(), 'stopping': self.stopping.state(),
+                'best_fitness': float(self.best_fitness), 'rng': Checkpoint.rng_state(self.rng)}
+        if self.surrogate is not None:
+            surrogate_arrays, meta['surrogate'] = self.surrogate.state()
+            arrays.update(surrogate_arrays)
+        self.checkpoint.save(generation, arrays, meta)
+
+    def load_checkpoint(self):
+        """
+        Restore the search state saved by save_checkpoint.
+
+        :return: generation to resume from
+        """
+        arrays, meta = self.checkpoint.load(self.checkpoint_settings())
+        self.population = arrays['population']
+        self.fitness_values = arrays['fitness_values']
+        self.best_individual = arrays['best_individual']
+        self.best_fitness = meta['best_fitness']
+        self.stopping.restore(meta['stopping'])
+        self.rng = Checkpoint.restore_rng(meta['rng'])
+        if self.surrogate is not None:
+            self.surrogate.restore(arrays, meta['surrogate'])
+        return meta['iteration']
+
+    def setup(self, base_station_num, edge_server_num):
+        """
+        Prepare the arrays of the first base_station_num base stations and a fresh random generator.
+        """
+        self.num_base_stations = base_station_num
+        self.num_edge_servers = edge_server_num
+        self.workloads = np.array([bs.workload for bs in self.base_stations[:base_station_num]], dtype=float)
+        self.distance_matrix = self._distance_matrix()[:base_station_num, :base_station_num]
+        self.rng = np.random.default_rng(self.seed)
+        self.best_individual = None
+        self.best_fitness = np.inf
+        if self.fitness_cache is not None:
+            self.fitness_cache.clear()
+        self.surrogate = None
+        if self.surrogate_fraction is not None:
+            self.surrogate = SurrogateSample(self.workloads, self.surrogate_fraction, self.surrogate_strata,
+                                             self.surrogate_every, None if self.seed is None else [self.seed, 1])
+            self.surrogate.draw(0, self.max_generations)
+
+    def refresh_surrogate(self, generation):
+        """
+        Re-score the best individual exactly to track the estimation error, draw a larger sample and re-evaluate
+        the population on it so fitness values stay comparable.
+        """
+        exact = self._population_fitness(self.best_individual[None, :], exact=True)[0]
+        self.surrogate.record_error(self.best_fitness, exact)
+        self.surrogate.draw(generation, self.max_generations)
+        if self.fitness_cache is not None:
+            self.fitness_cache.clear()
+        self.best_fitness = self._population_fitness(self.best_individual[None, :])[0]
+        self.evaluate_population()
+        # the fitness scale changed, stagnation is measured from the best fitness on the new sample
+        self.stopping.rebase(self.best_fitness)
+        logging.info("{0}: GA surrogate sample {1} base stations, best individual error {2:.4f}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), len(self.surrogate.rows), self.surrogate.errors[-1]))
+
+    def finish_surrogate(self):
+        """
+        Exact scoring at the end: the best individual and the final population, the exact best wins.
+        """
+        exact = self._population_fitness(self.best_individual[None, :], exact=True)[0]
+        self.surrogate.record_error(self.best_fitness, exact)
+        self.fitness_values = self._population_fitness(self.population, exact=True)
+        self.best_fitness = exact
+        best_idx = np.argmin(self.fitness_values)
+        if self.fitness_values[best_idx] < exact:
+            self.best_fitness = self.fitness_values[best_idx]
+            self.best_individual = self.population[best_idx].copy()
 
     def place_server(self, base_station_num, edge_server_num):
         """
@@ -161,23 +308,54 @@ class GAServerPlacer(ServerPlacer):
         """
         logging.info("{0}: Start running GA with N={1}, K={2}".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                                                                       base_station_num, edge_server_num))
-        self.num_base_stations = base_station_num
-        self.num_edge_servers = edge_server_num
+        self.setup(base_station_num, edge_server_num)
+        self.stopping = StoppingCriterion(self.max_generations, self.time_budget, self.stagnation_generations,
+                                          self.stagnation_epsilon)
+        self.stopping.start()
+        self.checkpoint = Checkpoint(self.checkpoint_path, self.checkpoint_every,
+                                     {'n': self.num_base_stations, 'k': self.num_edge_servers, 'seed': self.seed})
 
-        for generation in range(self.max_generations):
+        if self.checkpoint.exists():
+            generation = self.load_checkpoint()  # restores the surrogate sample as well
+        else:
+            generation = 0
+            self.population = self._random_sites(self.population_size)
+            self.evaluate_population()
+        while not self.stopping.check(generation, self.best_fitness):
+            if self.surrogate is not None and generation and self.surrogate.due(generation):
+                self.refresh_surrogate(generation)
             self.update_population()
+            generation += 1
+
+            # Best solution (global best) so far
+            logging.info(f"Generation {generation}/{self.max_generations} - Best Fitness: {self.best_fitness}")
+            if self.checkpoint.due(generation):
+                self.save_checkpoint(generation)
 
-            # Best solution (global best) in this generation
-            best_idx = np.argmin(self.fitness_values)
-            logging.info(f"Generation {generation + 1}/{self.max_generations} - Best Fitness: {self.fitness_values[best_idx]}")
+        # the run is complete, a rerun with the same path starts over
+        self.checkpoint.finish()
+        if self.surrogate is not None:
+            self.finish_surrogate()
 
-        # After finding the best placement, assign base stations to edge servers
-        best_individual = self.population[best_idx]
-        edge_servers = [EdgeServer(i, self.base_stations[i].latitude, self.base_stations[i].longitude) for i in range(edge_server_num)]
-        for i, base_station in enumerate(self.base_stations):
-            closest_edge_server_idx = int(best_individual[i] * edge_server_num)
-            edge_servers[closest_edge_server_idx].assigned_base_stations.append(base_station)
-            edge_servers[closest_edge_server_idx].workload += base_station.workload
+        # After finding the best placement, assign base stations to the closest edge server
+        self.process_result(self.best_individual)
+        self.run_info = self.stopping.report()
+        if self.checkpoint_path is not None:
+            self.run_info.update(self.checkpoint.report())
+        if self.surrogate is not None:
+            self.run_info.update(self.surrogate.report())
+        if self.fitness_cache is not None:
+            logging.info("{0}: GA fitness cache {1}".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                            self.fitness_cache.stats()))
+        logging.info("{0}: End running GA ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                        self.run_info))
 
+    def process_result(self, sites):
+        """
+        Build edge servers on the selected sites and assign every base station to the closest one.
+        """
+        base_stations = self.base_stations[:self.num_base_stations]
+        edge_servers = [EdgeServer(i, base_stations[x].latitude, base_stations[x].longitude, base_stations[x].id)
+                        for i, x in enumerate(np.sort(sites))]
+        self._assign_nearest(base_stations, edge_servers)
         self.edge_servers = edge_servers
-        logging.info("{0}: End running GA".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
@@ -0,0 +1,113 @@
+import heapq
+import logging
+from datetime import datetime
+from typing import List
+
+import numpy as np
+
+from data.base_station import BaseStation
+from data.edge_server import EdgeServer
+from .server_placer import ServerPlacer
+
+
+class GreedyPMedianServerPlacer(ServerPlacer):
+    """
+    Greedy p-median approach with lazy evaluation (CELF).
+
+    Sites are added one at a time by the largest reduction of the workload-weighted distance of the base stations
+    to their closest site (the plain distance when not weighted). Every base station's current closest distance is kept
+    in an array. Marginal gains only shrink as sites are added, so they sit in a priority queue and only the top
+    entry is re-evaluated until an up-to-date gain stays on top.
+
+    The greedy order is nested: the placement for K is the first K sites of the order. The order is kept between
+    calls and extended on demand, so a sweep over growing K on the same N costs one greedy run up to the largest K.
+    """
+    name = 'GreedyPMedian'
+
+    def __init__(self, base_stations: List[BaseStation], distances: List[List[float]], weighted=True,
+                 block_size=256):
+        super().__init__(base_stations, distances)
+        self.weighted = weighted
+        self.block_size = block_size
+        self.num_base_stations = None
+        self.distance_matrix = None
+        self.weights = None
+        self.order = []  # greedy order of site indices
+        self.closest = None
+        self.queue = None
+        self.evaluations = 0
+
+    def place_server(self, base_station_num, edge_server_num):
+        logging.info("{0}:Start running greedy p-median with N={1}, K={2}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), base_station_num, edge_server_num))
+        base_stations = self.base_stations[:base_station_num]
+        sites = self.sites(base_station_num, edge_server_num)
+
+        edge_servers = [EdgeServer(i, base_stations[x].latitude, base_stations[x].longitude, base_stations[x].id)
+                        for i, x in enumerate(np.sort(sites))]
+        self._assign_nearest(base_stations, edge_servers)
+        self.edge_servers = edge_servers
+        self.run_info = {'greedy_sites': len(self.order), 'gain_evaluations': self.evaluations}
+        logging.info("{0}:End running greedy p-median ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                                    self.run_info))
+
+    def sites(self, base_station_num, edge_server_num) -> np.ndarray:
+        """
+        First edge_server_num sites of the greedy order on the first base_station_num base stations, the order is
+        (re)started for a different N and extended when it is too short.
+        """
+        if edge_server_num > base_station_num:
+            raise ValueError("Cannot place K={0} edge servers on N={1} base stations".format(edge_server_num,
+                                                                                          base_station_num))
+        if base_station_num != self.num_base_stations:
+            self.reset(base_station_num)
+        while len(self.order) < edge_server_num:
+            self.add_site()
+        return np.array(self.order[:edge_server_num])
+
+    def reset(self, base_station_num):
+        self.num_base_stations = base_station_num
+        self.distance_matrix = self._distance_matrix()[:base_station_num, :base_station_num]
+        if self.weighted:
+            self.weights = np.array([bs.workload for bs in self.base_stations[:base_station_num]], dtype=float)
+        else:
+            self.weights = np.ones(base_station_num)
+        self.order = []
+        self.closest = None
+        self.queue = None
+        self.evaluations = 0
+
+    def add_site(self):
+        if not self.order:
+            # 1-median: the site with the smallest total weighted distance
+            totals = np.empty(self.num_base_stations)
+            for start in range(0, self.num_base_stations, self.block_size):
+                block = self.distance_matrix[start:start + self.block_size]  # symmetric store, rows are columns
+                totals[start:start + len(block)] = block @ self.weights
+            self.evaluations += self.num_base_stations
+            self._select(int(totals.argmin()))
+            gains = np.empty(self.num_base_stations)
+            for start in range(0, self.num_base_stations, self.block_size):
+                block = self.distance_matrix[start:start + self.block_size]
+                gains[start:start + len(block)] = np.maximum(self.closest - block, 0) @ self.weights
+            self.evaluations += self.num_base_stations
+            # entries: (-gain, site, number of sites the gain was computed for)
+            self.queue = [(-gain, site, 1) for site, gain in enumerate(gains) if site != self.order[0]]
+            heapq.heapify(self.queue)
+            return
+
+        while True:
+            gain, site, stamp = heapq.heappop(self.queue)
+            if stamp == len(self.order):
+                self._select(site)
+                return
+            gain = np.maximum(self.closest - self.distance_matrix[site], 0) @ self.weights
+            self.evaluations += 1
+            heapq.heappush(self.queue, (-gain, site, len(self.order)))
+
+    def _select(self, site):
+        self.order.append(site)
+        if self.closest is None:
+            self.closest = self.distance_matrix[site].copy()
+        else:
+            np.minimum(self.closest, self.distance_matrix[site], out=self.closest)
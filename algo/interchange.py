@@ -0,0 +1,181 @@
+import logging
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+class FastInterchange(object):
+    """
+    Fast interchange (Whitaker) local search on a set of edge server sites.
+
+    The nearest and second nearest site of every base station are kept as arrays, so the objective change of
+    swapping a candidate site in for each current site is computed for a block of candidates at once, and the best
+    improving swap of the block is applied right away. After a swap only base stations whose nearest or second
+    nearest site was the removed one, or which are closer to the new site than to their second nearest, are
+    updated. Passes over all candidates repeat until none improves, max_passes is reached or time_budget runs out.
+
+    The objective is latency_weight * average distance + balance_weight * standard deviation of the edge server
+    workloads under nearest assignment, the same quantities as ServerPlacer.compute_objectives(). Both change
+    terms are exact: the workload term tracks the sum of squared loads through the base stations that fall back to
+    their second nearest site when theirs is removed.
+    """
+
+    def __init__(self, latency_weight=1.0, balance_weight=0.0, weighted=False, time_budget=None, max_passes=20,
+                 block_size=64):
+        """
+        :param latency_weight: weight of the average distance(km)
+        :param balance_weight: weight of the workload standard deviation
+        :param weighted: workload-weighted average distance, the plain average by default
+        :param time_budget: seconds, the search stops after the block that exceeds it
+        """
+        self.latency_weight = latency_weight
+        self.balance_weight = balance_weight
+        self.weighted = weighted
+        self.time_budget = time_budget
+        self.max_passes = max_passes
+        self.block_size = block_size
+        self.distance_matrix = None
+        self.workloads = None
+        self.latency_weights = None
+        self.sites = None
+        self.nearest = None
+        self.second = None
+        self.d_nearest = None
+        self.d_second = None
+        self.loads = None
+
+    def improve(self, distance_matrix: np.ndarray, workloads, sites) -> (np.ndarray, dict):
+        """
+        Improve a placement by single site swaps.
+
+        :param distance_matrix: symmetric distance(km) matrix of the base stations
+        :param workloads: workload of each base station
+        :param sites: indices of the current sites
+        :return: improved sites and run details
+        """
+        start = time.perf_counter()
+        self.distance_matrix = distance_matrix
+        self.workloads = np.asarray(workloads, dtype=float)
+        self.latency_weights = self.workloads if self.weighted else np.ones(len(self.workloads))
+        self.sites = np.array(sites, dtype=int)
+        n, k = len(self.workloads), len(self.sites)
+        info = {'interchange_swaps': 0, 'interchange_passes': 0, 'interchange_stop': 'converged'}
+        if k < 2 or k >= n:
+            info['interchange_time'] = time.perf_counter() - start
+            return self.sites, info
+
+        self._update_nearest(np.arange(n))
+        initial = self.objective()
+        tolerance = 1e-9 * max(abs(initial), 1)
+        for passes in range(1, self.max_passes + 1):
+            info['interchange_passes'] = passes
+            improved = False
+            for block in range(0, n, self.block_size):
+                candidates = np.arange(block, min(block + self.block_size, n))
+                candidates = candidates[~np.isin(candidates, self.sites)]
+                if len(candidates):
+                    delta = self.swap_delta(candidates)
+                    row, column = np.unravel_index(delta.argmin(), delta.shape)
+                    if delta[row, column] < -tolerance:
+                        self.swap(column, candidates[row])
+                        info['interchange_swaps'] += 1
+                        improved = True
+                if self.time_budget is not None and time.perf_counter() - start > self.time_budget:
+                    info['interchange_stop'] = 'time_budget'
+                    break
+            if info['interchange_stop'] == 'time_budget' or not improved:
+                break
+        else:
+            info['interchange_stop'] = 'max_passes'
+
+        info['interchange_gain'] = initial - self.objective()
+        info['interchange_time'] = time.perf_counter() - start
+        logging.info("{0}: Fast interchange finished ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                                   info))
+        return self.sites, info
+
+    def objective(self):
+        value = 0
+        if self.latency_weight:
+            value += self.latency_weight * self.latency_weights @ self.d_nearest / self.latency_weights.sum()
+        if self.balance_weight:
+            value += self.balance_weight * np.std(self.loads)
+        return float(value)
+
+    def _update_nearest(self, rows):
+        """
+        Nearest and second nearest site (positions in self.sites) of the given base stations, and the loads.
+        """
+        if self.nearest is None or len(rows) == len(self.workloads):
+            n = len(self.workloads)
+            self.nearest, self.second = np.zeros(n, dtype=int), np.zeros(n, dtype=int)
+            self.d_nearest, self.d_second = np.zeros(n), np.zeros(n)
+        distances = self.distance_matrix[rows[:, None], self.sites[None, :]]
+        two = np.argpartition(distances, 1, axis=1)[:, :2]
+        pair = np.take_along_axis(distances, two, axis=1)
+        first = pair.argmin(axis=1)
+        index = np.arange(len(rows))
+        self.nearest[rows], self.second[rows] = two[index, first], two[index, 1 - first]
+        self.d_nearest[rows], self.d_second[rows] = pair[index, first], pair[index, 1 - first]
+        self.loads = np.bincount(self.nearest, weights=self.workloads, minlength=len(self.sites))
+
+    def swap(self, position, site):
+        """
+        Replace the site at position with site and update the affected base stations.
+        """
+        d = self.distance_matrix[site]
+        affected = (self.nearest == position) | (self.second == position) | (d < self.d_second)
+        self.sites[position] = site
+        self._update_nearest(np.flatnonzero(affected))
+
+    def swap_delta(self, candidates):
+        """
+        Objective change of swapping every candidate site in for every current site.
+
+        :param candidates: base station indices that are not sites
+        :return: matrix (candidates x sites) of objective changes, negative is an improvement
+        """
+        c, k = len(candidates), len(self.sites)
+        w = self.workloads
+        nearest, second = self.nearest, self.second
+        d_nearest, d_second = self.d_nearest[None, :], self.d_second[None, :]
+        d = self.distance_matrix[candidates]  # rows of the symmetric store, distances candidate -> base station
+        offsets = np.arange(c)[:, None] * k
+
+        def per_site(values, labels=nearest):
+            # sum values (candidates x base stations) by the site position of every base station
+            return np.bincount((labels[None, :] + offsets).ravel(), weights=values.ravel(),
+                               minlength=c * k).reshape(c, k)
+
+        closer = d < d_nearest  # moves to the candidate whatever site is removed
+        between = ~closer & (d < d_second)  # moves to the candidate if its nearest site is removed
+        farther = ~closer & ~between  # falls back to its second nearest site if its nearest site is removed
+        delta = np.zeros((c, k))
+
+        if self.latency_weight:
+            lw = self.latency_weights
+            loss = np.bincount(nearest, weights=lw * (self.d_second - self.d_nearest), minlength=k)
+            shared = np.where(closer, lw * (d - d_nearest), 0).sum(axis=1)
+            correction = np.where(closer, lw * (d_nearest - d_second), 0) + np.where(between, lw * (d - d_second), 0)
+            delta += self.latency_weight * (loss[None, :] + per_site(correction) + shared[:, None]) / lw.sum()
+
+        if self.balance_weight:
+            total = w.sum()
+            # loads after the candidate takes the closer base stations, before any site is removed
+            kept = self.loads[None, :] - per_site(np.where(closer, w, 0))
+            joined = np.where(closer, w, 0).sum(axis=1)
+            to_candidate = per_site(np.where(between, w, 0))
+            # loads moved from a removed site to each second nearest site, grouped by (nearest, second) pair
+            pairs, pair_index = np.unique(nearest * k + second, return_inverse=True)
+            pair_offsets = np.arange(c)[:, None] * len(pairs)
+            moved = np.bincount((pair_index[None, :] + pair_offsets).ravel(),
+                                weights=np.where(farther, w, 0).ravel(),
+                                minlength=c * len(pairs)).reshape(c, len(pairs))
+            moved_squares = per_site(moved ** 2, labels=pairs // k)
+            cross = per_site(np.where(farther, w * np.take_along_axis(kept, np.broadcast_to(second, d.shape), 1), 0))
+            squares = ((kept ** 2).sum(axis=1)[:, None] - kept ** 2 + 2 * cross + moved_squares +
+                       (joined[:, None] + to_candidate) ** 2)
+            std = np.sqrt(np.maximum(squares / k - (total / k) ** 2, 0))
+            delta += self.balance_weight * (std - np.std(self.loads))
+        return delta
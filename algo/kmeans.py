@@ -6,6 +6,7 @@ import numpy as np
 import scipy.cluster.vq as vq
 from sklearn.cluster import KMeans
 
+from data.base_station import BaseStation
 from data.edge_server import EdgeServer
 
 from .server_placer import ServerPlacer
@@ -14,8 +15,16 @@ from .server_placer import ServerPlacer
 class KMeansServerPlacer(ServerPlacer):
     """
     K-means approach
+    
+    With snap_to_sites the centroids are moved to the nearest distinct base stations and every base station is
+    assigned to its closest snapped site, so the placement uses the distance store and is placeable in reality.
     """
     name = 'KMeans'
+
+    def __init__(self, base_stations: List[BaseStation], distances: List[List[float]], snap_to_sites=False):
+        super().__init__(base_stations, distances)
+        self.snap_to_sites = snap_to_sites
+
     def place_server(self, base_station_num, edge_server_num):
         logging.info("{0}:Start running k-means with N={1}, K={2}".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                                                                           base_station_num, edge_server_num))
@@ -31,10 +40,21 @@ class KMeansServerPlacer(ServerPlacer):
         label = kmeans.labels_
 
         # process result
-        edge_servers = [EdgeServer(i, row[0], row[1]) for i, row in enumerate(centroid)]
-        for bs, es in enumerate(label):
-            edge_servers[es].assigned_base_stations.append(base_stations[bs])
-            edge_servers[es].workload += base_stations[bs].workload
-
-        self.edge_servers = list(filter(lambda x: x.workload != 0, edge_servers))
+        self.edge_servers = self._process_centroids(base_stations, centroid, label)
         logging.info("{0}:End running k-means".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def _process_centroids(self, base_stations: List[BaseStation], centroid: np.ndarray, label: np.ndarray):
+        """
+        Build edge servers from k-means centroids and labels
+        
+        :return: edge servers that received workload
+        """
+        if self.snap_to_sites:
+            sites = self._snap_to_base_stations(centroid, base_stations)
+            edge_servers = [EdgeServer(i, base_stations[x].latitude, base_stations[x].longitude, base_stations[x].id)
+                            for i, x in enumerate(sites)]
+            self._assign_nearest(base_stations, edge_servers)
+        else:
+            edge_servers = [EdgeServer(i, row[0], row[1]) for i, row in enumerate(centroid)]
+            self._apply_assignment(base_stations, edge_servers, label)
+        return list(filter(lambda x: x.workload != 0, edge_servers))
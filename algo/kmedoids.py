@@ -0,0 +1,180 @@
+import logging
+from datetime import datetime
+from typing import List
+
+import numpy as np
+
+from data.base_station import BaseStation
+from data.edge_server import EdgeServer
+from .server_placer import ServerPlacer
+
+
+class KMedoidsServerPlacer(ServerPlacer):
+    """
+    K-medoids approach on the distance store, no external solver.
+
+    The build phase seeds K medoids with k-means++ sampling (init='k-means++') or the greedy PAM build
+    (init='greedy', O(K N^2)). The swap phase follows FasterPAM: with the nearest and second nearest medoid of every
+    base station kept as arrays, the cost change of swapping a candidate site in for each medoid is computed for a
+    block of candidates at once, and the best improving swap of the block is applied right away. Passes over all
+    candidates repeat until none improves. With weighted the cost is the workload-weighted distance, otherwise the
+    plain average distance.
+    """
+    name = 'KMedoids'
+
+    def __init__(self, base_stations: List[BaseStation], distances: List[List[float]], init='k-means++',
+                 weighted=False, max_passes=20, block_size=64, seed=None):
+        super().__init__(base_stations, distances)
+        if init not in ('k-means++', 'greedy'):
+            raise ValueError("Unknown k-medoids init: {0}".format(init))
+        self.init = init
+        self.weighted = weighted
+        self.max_passes = max_passes
+        self.block_size = block_size
+        self.seed = seed
+        self.rng = None
+        self.distance_matrix = None
+        self.weights = None
+        self.medoids = None
+        self.nearest = None
+        self.d_nearest = None
+        self.d_second = None
+
+    def place_server(self, base_station_num, edge_server_num):
+        logging.info("{0}:Start running k-medoids with N={1}, K={2}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), base_station_num, edge_server_num))
+        base_stations = self.base_stations[:base_station_num]
+        self.distance_matrix = self._distance_matrix()[:base_station_num, :base_station_num]
+        if self.weighted:
+            self.weights = np.array([bs.workload for bs in base_stations], dtype=float)
+        else:
+            self.weights = np.ones(base_station_num)
+        self.rng = np.random.default_rng(self.seed)
+
+        if self.init == 'greedy':
+            self.medoids = self.build_greedy(edge_server_num)
+        else:
+            self.medoids = self.build_kmeans_pp(edge_server_num)
+        self._update_nearest()
+        build_cost = self.cost()
+        passes, swaps = self.swap_phase()
+
+        edge_servers = [EdgeServer(i, base_stations[x].latitude, base_stations[x].longitude, base_stations[x].id)
+                        for i, x in enumerate(np.sort(self.medoids))]
+        self._assign_nearest(base_stations, edge_servers)
+        self.edge_servers = edge_servers
+        self.run_info = {'build_cost': build_cost, 'cost': self.cost(), 'passes': passes, 'swaps': swaps}
+        logging.info("{0}:End running k-medoids ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                              self.run_info))
+
+    def cost(self):
+        return float(self.weights @ self.d_nearest / self.weights.sum())
+
+    def build_kmeans_pp(self, k):
+        """
+        k-means++ seeding: every next medoid is drawn with probability proportional to weight * distance^2 to the
+        closest medoid so far.
+        """
+        n = len(self.weights)
+        medoids = [int(self.rng.choice(n, p=self.weights / self.weights.sum()))]
+        closest = self.distance_matrix[medoids[0]].copy()
+        for _ in range(1, k):
+            scores = self.weights * closest ** 2
+            total = scores.sum()
+            if total > 0:
+                site = int(self.rng.choice(n, p=scores / total))
+            else:  # every base station sits on a medoid already
+                site = int(self.rng.choice(np.setdiff1d(np.arange(n), medoids)))
+            medoids.append(site)
+            np.minimum(closest, self.distance_matrix[site], out=closest)
+        return np.array(medoids)
+
+    def build_greedy(self, k):
+        """
+        PAM build: start from the 1-median and add the site with the largest cost reduction until there are k.
+        """
+        medoids = [int((self.weights @ self.distance_matrix).argmin())]
+        closest = self.distance_matrix[medoids[0]].copy()
+        for _ in range(1, k):
+            gains = np.zeros(len(self.weights))
+            for start in range(0, len(gains), self.block_size):
+                block = self.distance_matrix[start:start + self.block_size]
+                gains[start:start + len(block)] = np.maximum(closest - block, 0) @ self.weights
+            gains[medoids] = -1
+            site = int(gains.argmax())
+            medoids.append(site)
+            np.minimum(closest, self.distance_matrix[site], out=closest)
+        return np.array(medoids)
+
+    def _update_nearest(self):
+        """
+        Nearest medoid (position in self.medoids), its distance and the distance to the second nearest medoid.
+        """
+        distances = self.distance_matrix[:, self.medoids]
+        if len(self.medoids) == 1:
+            self.nearest = np.zeros(len(distances), dtype=int)
+            self.d_nearest = distances[:, 0]
+            self.d_second = np.full(len(distances), np.inf)
+            return
+        two = np.argpartition(distances, 1, axis=1)[:, :2]
+        pair = np.take_along_axis(distances, two, axis=1)
+        first = pair.argmin(axis=1)
+        rows = np.arange(len(distances))
+        self.nearest = two[rows, first]
+        self.d_nearest = pair[rows, first]
+        self.d_second = pair[rows, 1 - first]
+
+    def swap_delta(self, candidates):
+        """
+        Cost change of swapping every candidate site in for every medoid.
+
+        :param candidates: site indices that are not medoids
+        :return: matrix (candidates x medoids) of cost changes, negative is an improvement
+        """
+        k = len(self.medoids)
+        w = self.weights
+        d_nearest, d_second = self.d_nearest[None, :], self.d_second[None, :]
+        d = self.distance_matrix[candidates]  # rows of the symmetric store, distances candidate -> base station
+
+        # removal loss of every medoid: its base stations fall back to their second nearest medoid
+        loss = np.bincount(self.nearest, weights=w * (np.minimum(self.d_second, 1e300) - self.d_nearest),
+                           minlength=k)
+
+        closer = d < d_nearest
+        between = ~closer & (d < d_second)
+        # base stations moving to the candidate whatever medoid is removed
+        shared = np.where(closer, w * (d - d_nearest), 0).sum(axis=1)
+        # corrections of the removal loss of each base station's nearest medoid
+        correction = (np.where(closer, w * (d_nearest - np.minimum(d_second, 1e300)), 0) +
+                      np.where(between, w * (d - np.minimum(d_second, 1e300)), 0))
+        offsets = np.arange(len(candidates))[:, None] * k
+        corrections = np.bincount((self.nearest[None, :] + offsets).ravel(), weights=correction.ravel(),
+                                  minlength=len(candidates) * k).reshape(len(candidates), k)
+        return loss[None, :] + corrections + shared[:, None]
+
+    def swap_phase(self):
+        """
+        FasterPAM-style swaps until a full pass over the candidates finds no improvement.
+
+        :return: number of passes and swaps
+        """
+        n = len(self.weights)
+        swaps = 0
+        passes = 0
+        for passes in range(1, self.max_passes + 1):
+            improved = False
+            for start in range(0, n, self.block_size):
+                candidates = np.arange(start, min(start + self.block_size, n))
+                candidates = candidates[~np.isin(candidates, self.medoids)]
+                if not len(candidates):
+                    continue
+                delta = self.swap_delta(candidates)
+                row, column = np.unravel_index(delta.argmin(), delta.shape)
+                if delta[row, column] < -1e-9 * self.weights.sum():
+                    self.medoids[column] = candidates[row]
+                    self._update_nearest()
+                    swaps += 1
+                    improved = True
+            if not improved:
+                break
+        return passes, swaps
@@ -0,0 +1,149 @@
+import logging
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+class LagrangianBound(object):
+    """
+    Lagrangian relaxation lower bound of the p-median latency objective.
+
+    Relaxing "every base station is assigned once" with multipliers lambda_i leaves
+        L(lambda) = sum_i lambda_i + sum of the K smallest reduced costs rho_j,  rho_j = sum_i min(0, c_ij - lambda_i)
+    with c_ij the (workload-weighted) distance, a lower bound of the optimal total distance for any lambda. The
+    multipliers are improved by subgradient optimization (Held-Karp step towards the best upper bound, the step
+    scale is halved when the bound has not improved for `patience` iterations). Only sites closer than
+    lambda_i / w_i add to the reduced costs, so they are summed over sorted nearest neighbor lists of the base
+    stations. Base stations whose multiplier outgrows their list use the full distance row, and the lists are
+    doubled when there are too many of those. Every relaxed solution also gives an upper bound by assigning the
+    base stations to their nearest of its K sites.
+    """
+
+    def __init__(self, max_iterations=1000, time_limit=None, patience=20, step_scale=2.0, min_step_scale=1e-4,
+                 tolerance=1e-4, neighbors=32, wide_share=0.02, block_size=512):
+        """
+        :param neighbors: initial length of the nearest neighbor lists
+        :param wide_share: share of base stations summed over full rows before the lists are doubled
+        :param time_limit: seconds, the bound found so far is returned after it
+        :param patience: iterations without improvement before the step scale is halved
+        :param tolerance: relative gap between upper and lower bound to stop at
+        """
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.patience = patience
+        self.step_scale = step_scale
+        self.min_step_scale = min_step_scale
+        self.tolerance = tolerance
+        self.neighbors = neighbors
+        self.wide_share = wide_share
+        self.block_size = block_size
+        self.multipliers = None
+        self.sites = None  # sites of the best upper bound
+
+    def compute(self, distance_matrix: np.ndarray, k, weights=None, sites=None) -> dict:
+        """
+        Lower bound of the average distance of base stations to their nearest of k sites.
+
+        :param distance_matrix: symmetric distance(km) matrix of the base stations
+        :param weights: workload of each base station for the workload-weighted average, the plain average by default
+        :param sites: known placement, its distances start the multipliers and the upper bound
+        :return: average distance bound, upper bound of the best relaxed solution and run details
+        """
+        start = time.perf_counter()
+        n = len(distance_matrix)
+        weights = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+        total = weights.sum()
+        neighbors, radius, costs = self._neighbors(distance_matrix, weights, max(self.neighbors, 2 * -(-n // k)))
+        if sites is None:
+            # every site serves n / k base stations on average, start from the distance to the (n / k)-th nearest
+            multipliers = costs[:, min(-(-n // k), costs.shape[1]) - 1].copy()
+            upper, self.sites = np.inf, None
+        else:
+            self.sites = np.array(sites, dtype=int)
+            multipliers = weights * distance_matrix[:, self.sites].min(axis=1)
+            upper = multipliers.sum()
+
+        lower, best_multipliers = -np.inf, multipliers.copy()
+        step_scale, stale = self.step_scale, 0
+        iterations, stop = 0, 'max_iterations'
+        for iterations in range(1, self.max_iterations + 1):
+            # only sites closer than lambda_i / w_i have a negative reduced cost for base station i, base stations
+            # whose neighbor list is too short for that are summed over full rows of the distance matrix
+            wide = np.flatnonzero(multipliers > weights * radius)
+            while len(wide) > n * self.wide_share and neighbors.shape[1] < n:
+                neighbors, radius, costs = self._neighbors(distance_matrix, weights, 2 * neighbors.shape[1])
+                wide = np.flatnonzero(multipliers > weights * radius)
+            half = neighbors.shape[1] // 2
+            while half >= self.neighbors and half < n - 1 and np.all(multipliers <= costs[:, half]):
+                # the lists are sorted, keep the nearest half once the multipliers have come down
+                radius = distance_matrix[np.arange(n), neighbors[:, half]]
+                neighbors, costs = neighbors[:, :half], costs[:, :half]
+                half //= 2
+            contributions = np.minimum(costs - multipliers[:, None], 0)
+            contributions[wide] = 0
+            wide_contributions = np.minimum(weights[wide, None] * distance_matrix[wide] - multipliers[wide, None], 0)
+            reduced = (np.bincount(neighbors.ravel(), weights=contributions.ravel(), minlength=n) +
+                       wide_contributions.sum(axis=0))
+            selected = np.argpartition(reduced, k - 1)[:k] if k < n else np.arange(n)
+            value = multipliers.sum() + reduced[selected].sum()
+
+            feasible = weights @ distance_matrix[selected].min(axis=0)  # rows of the symmetric store
+            if feasible < upper:
+                upper, self.sites = feasible, np.sort(selected)
+            if value > lower + 1e-12 * abs(lower if np.isfinite(lower) else 0):
+                lower, best_multipliers, stale = value, multipliers.copy(), 0
+            else:
+                stale += 1
+                if stale >= self.patience:
+                    step_scale, stale = step_scale / 2, 0
+
+            if upper - lower <= self.tolerance * abs(upper):
+                stop = 'gap'
+                break
+            if step_scale < self.min_step_scale:
+                stop = 'step_scale'
+                break
+            if self.time_limit is not None and time.perf_counter() - start > self.time_limit:
+                stop = 'time_limit'
+                break
+            is_selected = np.zeros(n, dtype=bool)
+            is_selected[selected] = True
+            subgradient = 1 - np.count_nonzero(is_selected[neighbors] & (contributions < 0), axis=1)
+            subgradient[wide] = 1 - np.count_nonzero(is_selected[None, :] & (wide_contributions < 0), axis=1)
+            subgradient[weights == 0] = 0  # costs nothing wherever assigned, its multiplier stays 0
+            norm = subgradient @ subgradient
+            if norm == 0:  # the relaxed solution assigns every base station once, so it is optimal
+                stop = 'optimal'
+                break
+            multipliers = multipliers + step_scale * (upper - value) / norm * subgradient
+
+        self.multipliers = best_multipliers
+        logging.debug("Lagrangian bound used {0} neighbors per base station".format(neighbors.shape[1]))
+        result = {'bound': lower / total, 'upper_bound': upper / total, 'bound_iterations': iterations,
+                  'bound_stop': stop, 'bound_time': time.perf_counter() - start}
+        logging.info("{0}: Lagrangian bound finished ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                                  result))
+        return result
+
+    def _neighbors(self, distance_matrix, weights, m):
+        """
+        Sorted m nearest sites of every base station.
+
+        :return: neighbor indices (N x m), the distance every other site is at least away from each base station and
+                 the weighted distances to the neighbors
+        """
+        n = len(distance_matrix)
+        if m + 1 >= n:
+            neighbors = np.argsort(distance_matrix, axis=1, kind='stable')
+            return neighbors, np.full(n, np.inf), weights[:, None] * np.take_along_axis(distance_matrix, neighbors, 1)
+        neighbors = np.empty((n, m), dtype=int)
+        radius = np.empty(n)
+        for block in range(0, n, self.block_size):
+            rows = distance_matrix[block:block + self.block_size]
+            nearest = np.argpartition(rows, m, axis=1)[:, :m + 1]
+            order = np.argsort(np.take_along_axis(rows, nearest, axis=1), axis=1, kind='stable')
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            neighbors[block:block + len(rows)] = nearest[:, :m]
+            radius[block:block + len(rows)] = np.take_along_axis(rows, nearest[:, m:], axis=1)[:, 0]
+        return neighbors, radius, weights[:, None] * np.take_along_axis(distance_matrix, neighbors, axis=1)
@@ -1,29 +1,79 @@
 import math
 import logging
+import os
+import re
+import tempfile
+import time
 from datetime import datetime
 from typing import List, Iterable
 
 import numpy as np
-from pulp import LpProblem, LpVariable, lpSum, LpMinimize, LpBinary, value
+import pandas as pd
+from pulp import (LpProblem, LpVariable, lpSum, LpMinimize, LpBinary, LpSolution, LpSolutionOptimal,
+                  LpSolutionIntegerFeasible, PULP_CBC_CMD, value)
+from scipy import sparse
+from sklearn.neighbors import BallTree
+
+try:
+    from scipy.optimize import milp, LinearConstraint, Bounds
+except ImportError:  # scipy < 1.9
+    milp = None
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
 
 from data.base_station import BaseStation
 from data.edge_server import EdgeServer
+from .coverage import CoverageIndex, CoverageState
 from .server_placer import ServerPlacer
 
+EARTH_RADIUS = 6371  # km, BallTree haversine distances are in radians
+
+_CBC_SOLUTION = re.compile(r'Integer solution of (\S+) found.*\((\S+) seconds\)')
+_CBC_PROGRESS = re.compile(r'After \d+ nodes, \d+ on tree, (\S+) best solution, best possible (\S+) \((\S+) seconds\)')
+# final bound: summary line of a stopped search, integer gap exit, or a completed search (bound = incumbent)
+_CBC_LOWER_BOUND = re.compile(r'^Lower bound:\s+(\S+)')
+_CBC_GAP_EXIT = re.compile(r'Exiting as integer gap of ([^,\s]+)')
+_CBC_COMPLETED = re.compile(r'Search completed - best objective ([^,\s]+)')
+
 
 class MIPServerPlacer(ServerPlacer):
     """
-    MIP approach using PuLP
+    MIP approach
+
+    backend='highs' assembles the model as sparse matrices and solves it in process with HiGHS (highspy, or
+    scipy.optimize.milp without warm start and progress trace when highspy is not installed), backend='pulp'
+    builds it with PuLP and solves it with CBC. The HiGHS backend falls back to PuLP when neither is available.
+
+    time_limit (seconds) and mip_gap (relative) bound the solve, the best placement found so far is used when
+    the solver stops early. warm_start is a placer run with the same N and K before the solve (e.g. TopK or
+    K-means) or a list of base station indices, its sites become the initial solution. Solver progress
+    (incumbent, bound, gap over time) is kept in self.progress, the final status, objective, bound and gap are
+    reported with the objectives.
     """
     name = 'MIP'
 
-    def __init__(self, base_stations: List[BaseStation], distances: List[List[float]]):
+    def __init__(self, base_stations: List[BaseStation], distances: List[List[float]], backend='highs',
+                 time_limit=None, mip_gap=None, warm_start=None):
         super().__init__(base_stations, distances)
+        if backend not in ('highs', 'pulp'):
+            raise ValueError("Unknown MIP backend: {0}".format(backend))
+        if backend == 'highs' and highspy is None and milp is None:
+            logging.warning("Neither highspy nor scipy.optimize.milp is available, falling back to the PuLP backend")
+            backend = 'pulp'
+        self.backend = backend
+        self.time_limit = time_limit
+        self.mip_gap = mip_gap
+        self.warm_start = warm_start
         self.n = 0
         self.k = 0
         self.weights = None
-        self.belongs = None
+        self.belongs = None  # sparse n x n, entry (bs, es) is one if base station bs is in the neighborhood of es
+        self.coverage = None
         self.assign = None
+        self.progress = None
 
     def place_server(self, base_station_num, edge_server_num):
         logging.info("{0}:Start running MIP with N={1}, K={2}".format(
@@ -33,6 +83,196 @@ class MIPServerPlacer(ServerPlacer):
         self.k = edge_server_num
 
         self.preprocess_problem()
+        initial = self.warm_start_sites()
+        self.progress = []
+
+        if self.backend == 'pulp':
+            backend = 'pulp'
+            places, status = self._solve_pulp(initial)
+        elif highspy is not None:
+            backend = 'highs'
+            places, status = self._solve_highspy(initial)
+        else:
+            # scipy's HiGHS: no warm start and only the final incumbent, reported apart from the highspy runs
+            backend = 'scipy-highs'
+            places, status = self._solve_highs(initial)
+        if places is not None:
+            print("Solution value =", status['mip_objective'])
+            print("Edge servers placed at:", places)
+            self.process_result(places)
+        else:
+            print("No solution available")
+
+        self.progress = pd.DataFrame(self.progress, columns=['time', 'incumbent', 'bound', 'gap'])
+        self.run_info = {'backend': backend, **status, 'incumbents': len(self.progress),
+                         'warm_start_objective': float(np.sum(np.asarray(self.weights)[initial]))
+                         if initial is not None and backend != 'scipy-highs' else np.nan}
+        logging.info("{0}:End running MIP ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.run_info))
+
+    def warm_start_sites(self):
+        """
+        Placement variables set to one in the initial solution: the sites of the warm start placer (run first
+        with the same N and K) snapped to distinct base stations, or the given base station indices.
+        Missing sites are filled with the lowest weight stations.
+
+        :return: K base station indices or None without warm start
+        """
+        if self.warm_start is None:
+            return None
+        base_stations = self.base_stations[:self.n]
+        if isinstance(self.warm_start, ServerPlacer):
+            self.warm_start.place_server(self.n, self.k)
+            coordinates = [(es.latitude, es.longitude) for es in self.warm_start.edge_servers]
+            sites = self._snap_to_base_stations(coordinates, base_stations)
+        else:
+            sites = np.unique(np.asarray(self.warm_start, dtype=int))
+            sites = sites[sites < self.n]
+        sites = sites[:self.k]
+        if len(sites) < self.k:
+            free = np.setdiff1d(np.argsort(self.weights, kind='stable'), sites, assume_unique=True)
+            sites = np.concatenate([sites, free[:self.k - len(sites)]])
+        return np.sort(self._repair_coverage(sites))
+
+    def _repair_coverage(self, sites):
+        """
+        Make an initial placement feasible for the 90% assignment row by local search: drop a site (fewest base
+        stations covered by it alone first) and add the site covering the most uncovered base stations, as long as
+        the swap covers more base stations in total.
+        """
+        required = int(self.n * 0.9)
+        sites = np.array(sites)
+        state = CoverageState(self.coverage, sites)
+        while state.count < required:
+            loss = np.array([state.loss(site) for site in sites])
+            for out in np.argsort(loss, kind='stable'):
+                state.remove(sites[out])
+                gain = state.gains()
+                gain[sites] = -1
+                best = int(gain.argmax())
+                if gain[best] > loss[out]:
+                    sites[out] = best
+                    state.add(best)
+                    break
+                state.add(sites[out])
+            else:
+                break  # no improving swap, the solver repairs or rejects the start
+        return sites
+
+    def _record_progress(self, running_time, incumbent, bound):
+        gap = abs(incumbent - bound) / abs(incumbent) if incumbent and np.isfinite(bound) else np.inf
+        self.progress.append((running_time, incumbent, bound, gap))
+
+    def build_model(self):
+        """
+        Sparse form of the model over the variables [placement (n), assigned (n)]:
+        K placements, a base station is assigned only if one of the stations it belongs to holds an edge server,
+        and at least 90% of the base stations are assigned.
+
+        :return: objective vector, constraint matrix (CSR) and the row bounds
+        """
+        n = self.n
+        c = np.concatenate([np.asarray(self.weights, dtype=float), np.zeros(n)])
+
+        count = np.ones((1, n))
+        k_row = sparse.hstack([sparse.csr_matrix(count), sparse.csr_matrix((1, n))])
+
+        # belongs rows: sum(placement[es] for es in belongs[bs]) - assigned[bs] >= 0
+        belongs_rows = sparse.hstack([self.belongs, -sparse.identity(n, format='csr')])
+
+        acceptable_row = sparse.hstack([sparse.csr_matrix((1, n)), sparse.csr_matrix(count)])
+
+        matrix = sparse.vstack([k_row, belongs_rows, acceptable_row], format='csr')
+        row_lower = np.concatenate([[self.k], np.zeros(n), [int(n * 0.9)]])
+        row_upper = np.concatenate([[self.k], np.full(n + 1, np.inf)])
+        return c, matrix, row_lower, row_upper
+
+    def _initial_solution(self, initial):
+        """
+        Full variable vector of the warm start: its placements and every base station they cover.
+        """
+        x = np.zeros(2 * self.n)
+        x[initial] = 1
+        x[self.n + self.assign[initial].ravel()] = 1
+        return x
+
+    def _solve_highspy(self, initial):
+        start = time.perf_counter()
+        c, matrix, row_lower, row_upper = self.build_model()
+        matrix = matrix.tocsc()
+        lp = highspy.HighsLp()
+        lp.num_col_ = len(c)
+        lp.num_row_ = matrix.shape[0]
+        lp.col_cost_ = c
+        lp.col_lower_ = np.zeros(len(c))
+        lp.col_upper_ = np.ones(len(c))
+        lp.row_lower_ = row_lower
+        lp.row_upper_ = np.where(np.isinf(row_upper), highspy.kHighsInf, row_upper)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = matrix.indptr
+        lp.a_matrix_.index_ = matrix.indices
+        lp.a_matrix_.value_ = matrix.data
+        lp.integrality_ = [highspy.HighsVarType.kInteger] * len(c)
+
+        h = highspy.Highs()
+        h.setOptionValue('output_flag', False)
+        if self.time_limit is not None:
+            h.setOptionValue('time_limit', float(self.time_limit))
+        if self.mip_gap is not None:
+            h.setOptionValue('mip_rel_gap', float(self.mip_gap))
+        h.passModel(lp)
+        if initial is not None:
+            solution = highspy.HighsSolution()
+            solution.col_value = self._initial_solution(initial)
+            h.setSolution(solution)
+        h.cbMipImprovingSolution.subscribe(
+            lambda event: self._record_progress(event.data_out.running_time,
+                                                event.data_out.objective_function_value,
+                                                event.data_out.mip_dual_bound))
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        h.run()
+        solve_time = time.perf_counter() - start
+
+        info = h.getInfo()
+        status = {'build_time': build_time, 'solve_time': solve_time,
+                  'mip_status': h.modelStatusToString(h.getModelStatus()),
+                  'mip_objective': info.objective_function_value, 'mip_bound': info.mip_dual_bound,
+                  'mip_gap': info.mip_gap}
+        if info.primal_solution_status != highspy.kSolutionStatusFeasible:  # no feasible solution
+            return None, status
+        places = np.flatnonzero(np.asarray(h.getSolution().col_value)[:self.n] > 0.5).tolist()
+        return places, status
+
+    def _solve_highs(self, initial):
+        start = time.perf_counter()
+        c, matrix, row_lower, row_upper = self.build_model()
+        build_time = time.perf_counter() - start
+        if initial is not None:
+            logging.warning("highspy is not installed and scipy.optimize.milp does not take an initial solution, "
+                            "warm start is ignored")
+
+        options = {}
+        if self.time_limit is not None:
+            options['time_limit'] = self.time_limit
+        if self.mip_gap is not None:
+            options['mip_rel_gap'] = self.mip_gap
+        start = time.perf_counter()
+        result = milp(c, constraints=LinearConstraint(matrix, row_lower, row_upper), integrality=np.ones(len(c)),
+                      bounds=Bounds(0, 1), options=options)
+        solve_time = time.perf_counter() - start
+
+        bound = getattr(result, 'mip_dual_bound', np.nan)
+        status = {'build_time': build_time, 'solve_time': solve_time, 'mip_status': result.message,
+                  'mip_objective': result.fun, 'mip_bound': bound, 'mip_gap': getattr(result, 'mip_gap', np.nan)}
+        if result.x is None:  # no feasible solution
+            return None, status
+        self._record_progress(solve_time, result.fun, bound)
+        places = np.flatnonzero(result.x[:self.n] > 0.5).tolist()
+        return places, status
+
+    def _solve_pulp(self, initial):
+        start = time.perf_counter()
 
         # Create PuLP problem
         prob = LpProblem("EdgeServerPlacement", LpMinimize)
@@ -50,60 +290,100 @@ class MIPServerPlacer(ServerPlacer):
         prob += lpSum(placement_vars) == self.k
 
         # Constraint: Whether a base station has been assigned to an edge server
-        for bsid, esids in enumerate(self.belongs):
+        indptr, indices = self.belongs.indptr, self.belongs.indices
+        for bsid in range(self.n):
+            esids = indices[indptr[bsid]:indptr[bsid + 1]]
             prob += lpSum(placement_vars[esid] for esid in esids) >= assigned_vars[bsid]
 
         # Constraint: The total number of assigned base stations
         acceptable = int(self.n * 0.9)
         prob += lpSum(assigned_vars) >= acceptable
 
-        # Solve the problem
-        prob.solve()
+        if initial is not None:
+            for var, x in zip(placement_vars + assigned_vars, self._initial_solution(initial)):
+                var.setInitialValue(x)
+        build_time = time.perf_counter() - start
 
-        if prob.status == 1:  # Optimal solution found
-            print("Solution value =", value(prob.objective))
-            places = [i for i, var in enumerate(placement_vars) if value(var) == 1]
-            print("Edge servers placed at:", places)
-            self.process_result(places)
-        else:
-            print("No solution available")
+        # Solve the problem, CBC progress is read back from its log
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, 'cbc.log')
+            solver = PULP_CBC_CMD(msg=False, timeLimit=self.time_limit, gapRel=self.mip_gap,
+                                  warmStart=initial is not None, logPath=log_path)
+            start = time.perf_counter()
+            prob.solve(solver)
+            solve_time = time.perf_counter() - start
+            with open(log_path) as log:
+                final = self._parse_cbc_log(log)
+
+        objective = value(prob.objective)
+        # only the final bound is comparable with the HiGHS bound, the node log bounds are kept in self.progress
+        bound = objective - final[1] if final[0] == 'gap' else final[1]
+        status = {'build_time': build_time, 'solve_time': solve_time, 'mip_status': LpSolution[prob.sol_status],
+                  'mip_objective': objective, 'mip_bound': bound,
+                  'mip_gap': abs(objective - bound) / abs(objective) if objective and np.isfinite(bound) else np.nan}
+        if prob.sol_status not in (LpSolutionOptimal, LpSolutionIntegerFeasible):  # no feasible solution
+            return None, status
+        places = [i for i, var in enumerate(placement_vars) if value(var) > 0.5]
+        return places, status
+
+    def _parse_cbc_log(self, log):
+        """
+        Incumbents and bounds from the CBC log lines
+        "Integer solution of <obj> found ... (<t> seconds)" and
+        "After <n> nodes, <m> on tree, <obj> best solution, best possible <bound> (<t> seconds)".
 
-        logging.info("{0}:End running MIP".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        :return: how the final bound was reported ('bound', 'gap' or 'completed') and its value (the absolute gap for
+                 'gap'), (None, nan) if the log has none
+        """
+        bound = -np.inf
+        final = {}
+        for line in log:
+            for kind, pattern in (('bound', _CBC_LOWER_BOUND), ('gap', _CBC_GAP_EXIT),
+                                  ('completed', _CBC_COMPLETED)):
+                match = pattern.search(line)
+                if match:
+                    final[kind] = float(match.group(1))
+            match = _CBC_PROGRESS.search(line)
+            if match:
+                bound = float(match.group(2))
+                if float(match.group(1)) < 1e49:  # CBC reports 1e50 before the first incumbent
+                    self._record_progress(float(match.group(3)), float(match.group(1)), bound)
+                continue
+            match = _CBC_SOLUTION.search(line)
+            if match:
+                self._record_progress(float(match.group(2)), float(match.group(1)), bound)
+        for kind in ('bound', 'gap', 'completed'):
+            if kind in final:
+                return kind, final[kind]
+        return None, np.nan
 
     def preprocess_problem(self):
+        """
+        Neighborhood of every station: its cap = n / K nearest stations, found with a haversine ball tree
+        instead of the dense distance matrix. A station's weight combines the radius of its neighborhood and the
+        squared deviation of the neighborhood workload from the average edge server workload.
+        """
         base_stations = self.base_stations[:self.n]
-        d = np.array([row[:self.n] for row in self.distances[:self.n]])
         cap = int(len(base_stations) / self.k)
-        assign = []
-        max_distances = []
+        coordinates = np.radians([(bs.latitude, bs.longitude) for bs in base_stations])
+        tree = BallTree(coordinates, metric='haversine')
+        distances, assign = tree.query(coordinates, k=cap)  # sorted, so the last column is the farthest
+        max_distances = distances[:, -1] * EARTH_RADIUS
 
-        for i, row in enumerate(d):
-            indices = row.argpartition(cap)[:cap]
-            assign.append(indices)
-            max_distances.append(row[indices].max())
-
-        avg_workload = sum(bs.workload for bs in base_stations) / self.k
-        workload_diff = []
-
-        for row in assign:
-            assigned_stations = [base_stations[i] for i in row]
-            workload = sum(bs.workload for bs in assigned_stations)
-            workload_diff.append((workload - avg_workload) ** 2)
-
-        normalized_max_distances = MIPServerPlacer._normalize(max_distances)
-        normalized_workload_diff = MIPServerPlacer._normalize(workload_diff)
+        workloads = np.array([bs.workload for bs in base_stations], dtype=float)
+        avg_workload = workloads.sum() / self.k
+        workload_diff = (workloads[assign].sum(axis=1) - avg_workload) ** 2
 
         alpha = 0.5
-        self.weights = [
-            alpha * normalized_max_distances[i] + (1 - alpha) * normalized_workload_diff[i]
-            for i in range(self.n)
-        ]
-
-        self.belongs = [[] for _ in range(self.n)]
-        for i, row in enumerate(assign):
-            for bs in row:
-                self.belongs[bs].append(i)
+        self.weights = (alpha * MIPServerPlacer._normalize(max_distances) +
+                        (1 - alpha) * MIPServerPlacer._normalize(workload_diff))
 
+        # neighborhoods as coverage index (row es holds its neighborhood), belongs as CSR: row bs holds the
+        # stations whose neighborhood contains bs
+        neighborhoods = sparse.csr_matrix((np.ones(assign.size), (np.repeat(np.arange(self.n), cap), assign.ravel())),
+                                          shape=(self.n, self.n))
+        self.coverage = CoverageIndex.from_members(neighborhoods, workloads)
+        self.belongs = self.coverage.matrix().T.tocsr()
         self.assign = assign
 
     def process_result(self, solution):
@@ -125,6 +405,7 @@ class MIPServerPlacer(ServerPlacer):
 
     @staticmethod
     def _normalize(values: Iterable):
-        minimum = min(values)
-        delta = max(values) - minimum
-        return [(v - minimum) / delta for v in values]
\ No newline at end of file
+        values = np.asarray(values, dtype=float)
+        minimum = values.min()
+        delta = values.max() - minimum
+        return (values - minimum) / delta
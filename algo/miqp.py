@@ -1,28 +1,70 @@
 import logging
 import random
+import time
 import numpy as np
 from datetime import datetime
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpBinary
+from pulp import LpProblem, LpMinimize, LpVariable, LpAffineExpression, lpSum, LpBinary, PULP_CBC_CMD
+from scipy import sparse
+from sklearn.neighbors import BallTree
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
 
 from algo.server_placer import ServerPlacer
 from data.edge_server import EdgeServer
 
+EARTH_RADIUS = 6371  # km, BallTree haversine distances are in radians
+
 
 class MIQPServerPlacer(ServerPlacer):
     """
-    MIQP base heuristic using PuLP
+    MIQP base heuristic, solved with HiGHS (highspy) or PuLP
+
+    One assignment model is built per run and kept alive across the location-allocation iterations: locations
+    are fixed variables y_l and only the bounds of the locations that changed are updated between solves, each
+    solve is warm-started from the previous assignment moved to open locations. backend='highs' keeps the model
+    inside the solver, backend='pulp' keeps the PuLP problem and hands it to CBC on every solve.
+
+    By default every base station may be assigned to every location (n^2 assignment variables). With neighbors
+    and/or radius, assignment variables only exist for the k nearest locations and the locations within radius
+    km of each base station, found with a haversine ball tree, so the model grows with n * neighbors instead of
+    n^2. A base station without an open location among its candidates also gets a variable for its nearest open
+    location.
     """
     name = 'MIQP'
 
-    def __init__(self, base_stations, distances):
+    def __init__(self, base_stations, distances, neighbors=None, radius=None, backend='highs'):
         super().__init__(base_stations, distances)
+        if backend not in ('highs', 'pulp'):
+            raise ValueError("Unknown MIQP backend: {0}".format(backend))
+        if backend == 'highs' and highspy is None:
+            logging.warning("highspy is not available, falling back to the PuLP backend")
+            backend = 'pulp'
+        self.backend = backend
+        self.model = None
         self.n = 0
         self.k = 0
         self.workloads = np.array([bs.workload for bs in base_stations])
+        self.neighbors = neighbors
+        self.radius = radius
         self.avg_workload = None
+        self.wb_max = None
+        self.dist_max = None
         self.ln_coefs = None
         self.qmat = None
         self.dvars = None
+        # Assignment variables as sparse pairs (base station, location) with their objective coefficients
+        self.pair_rows = None
+        self.pair_cols = None
+        self.candidate_count = 0
+        self.build_time = 0
+        self.solve_time = 0
+
+    @property
+    def pruned(self):
+        return self.neighbors is not None or self.radius is not None
 
     def place_server(self, base_station_num, edge_server_num):
         logging.info("{0}: Start running MIQP with N={1}, K={2}".format(
@@ -31,89 +73,168 @@ class MIQPServerPlacer(ServerPlacer):
 
         self.n = base_station_num
         self.k = edge_server_num
-        distances = np.array([self.distances[i][:self.n] for i in range(self.n)])
+        distances = self._distance_matrix()[:self.n, :self.n]
+        self.build_time = 0
+        self.solve_time = 0
 
+        start = time.perf_counter()
         self.preprocess()
+        self.build_time += time.perf_counter() - start
 
         locations = [1] * self.k + [0] * (self.n - self.k)
         random.shuffle(locations)
 
-        prob, variables = self.setup_problem(locations)
-        prob.solve()
-
-        solutions = np.array(
-            [[int(variables['x_{0}_{1}'.format(i, l)].varValue) for l in range(self.n)] for i in range(self.n)]
-        )
+        start = time.perf_counter()
+        if self.pruned:
+            self._cover_open_locations(locations)
+        model_class = HighsAssignmentModel if self.backend == 'highs' else PulpAssignmentModel
+        self.model = model_class(self.n, self.pair_rows, self.pair_cols, self.ln_coefs, locations)
+        self.build_time += time.perf_counter() - start
+        solutions = self.solve_assignment(locations)
+        iteration = 0
 
         while True:
             centers = [0] * self.n
             for l, v in enumerate(locations):
                 if v == 1:
-                    min_dist = 1e10
-                    position = None
-                    mask = solutions[:, l]
-                    if mask.sum() == 0:
+                    members = np.flatnonzero(solutions == l)
+                    if len(members) == 0:
                         logging.warning("Empty edge server!")
                         centers[l] = 1
                         continue
 
-                    for ind, val in enumerate(mask):
-                        if val == 1:
-                            t = np.sum(distances[ind] * mask)
-                            if t < min_dist:
-                                min_dist = t
-                                position = ind
-
+                    # Medoid: the member with the smallest total distance to the other members
+                    position = members[distances[np.ix_(members, members)].sum(axis=1).argmin()]
                     centers[position] = 1
 
             if centers == locations:
                 self.process_result(solutions, locations)
                 break
 
+            iteration += 1
+            build_time, solve_time = self.build_time, self.solve_time
+            changed = self.update_locations(locations, centers)
             locations = centers
-            prob, variables = self.setup_problem(locations)
-            prob.solve()
-            solutions = np.array(
-                [[int(variables['x_{0}_{1}'.format(i, l)].varValue) for l in range(self.n)] for i in range(self.n)]
-            )
+            solutions = self.solve_assignment(locations, solutions)
+            logging.info("{0}: MIQP iteration {1}: {2} changed locations, build {3:.3f}s, solve {4:.3f}s".format(
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'), iteration, changed, self.build_time - build_time,
+                self.solve_time - solve_time))
+
+        pair_bytes = self.pair_rows.nbytes + self.pair_cols.nbytes + self.ln_coefs.nbytes
+        self.run_info = {'variables': len(self.pair_rows), 'pair_memory_mb': pair_bytes / 2 ** 20,
+                         'build_time': self.build_time, 'solve_time': self.solve_time, 'iterations': iteration}
+        logging.info("{0}: End running MIQP ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                         self.run_info))
 
-        logging.info("{0}: End running MIQP".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    def candidate_pairs(self):
+        """
+        (base station, location) pairs that get an assignment variable, sorted by base station.
+        """
+        if not self.pruned:
+            return np.divmod(np.arange(self.n * self.n), self.n)
+
+        base_stations = self.base_stations[:self.n]
+        coordinates = np.radians([(bs.latitude, bs.longitude) for bs in base_stations])
+        tree = BallTree(coordinates, metric='haversine')
+        rows, cols = [], []
+        if self.neighbors is not None:
+            ind = tree.query(coordinates, k=min(self.neighbors, self.n), return_distance=False)
+            rows.append(np.repeat(np.arange(self.n), ind.shape[1]))
+            cols.append(ind.ravel())
+        if self.radius is not None:
+            ind = tree.query_radius(coordinates, r=self.radius / EARTH_RADIUS)
+            rows.append(np.repeat(np.arange(self.n), [len(x) for x in ind]))
+            cols.append(np.concatenate(ind))
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        # the CSR structure merges pairs found by both queries and sorts them by base station
+        pairs = sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(self.n, self.n))
+        return np.repeat(np.arange(self.n), np.diff(pairs.indptr)), pairs.indices
 
     def preprocess(self):
-        mu = 0.5
         wl = self.workloads[:self.n]
-        dist_ln = np.array([self.distances[i][j] for i in range(self.n) for j in range(self.n)])
-        wl_ln = np.array([self.workloads[i] for i in range(self.n) for j in range(self.n)])
+        self.avg_workload = np.average(wl)
+        self.wb_max = np.var([np.sum(wl)] + [0] * (self.k - 1))
+        self.dist_max = self.n * self._distance_matrix()[:self.n, :self.n].max()
 
-        avg_workload = np.average(wl)
-        wb_max = np.var([np.sum(wl)] + [0] * (self.k - 1))
-        dist_max = self.n * np.max(dist_ln)
+        self.pair_rows, self.pair_cols = self.candidate_pairs()
+        self.candidate_count = len(self.pair_rows)
+        self.ln_coefs = self._coefs(self.pair_rows, self.pair_cols)
 
-        ln_coefs = -2 * mu * wl_ln * avg_workload / self.k / wb_max + (1 - mu) * dist_ln / dist_max
-        self.ln_coefs = ln_coefs.reshape(self.n, self.n)
+    def _coefs(self, rows, cols):
+        """
+        Linear objective coefficient of assigning base station rows[p] to location cols[p].
+        """
+        mu = 0.5
+        distances = self._distance_matrix()[rows, cols]
+        return (-2 * mu * self.workloads[rows] * self.avg_workload / self.k / self.wb_max +
+                (1 - mu) * distances / self.dist_max)
 
-    def setup_problem(self, locations):
-        prob = LpProblem("MIQP", LpMinimize)
+    def _cover_open_locations(self, locations):
+        """
+        Every base station without an open location among its candidate locations gets a pair to its nearest open
+        location, unless it has one already. New pairs are appended, so the position of a pair stays its variable
+        index in the model.
 
-        variables = {
-            f"x_{i}_{j}": LpVariable(f"x_{i}_{j}", cat=LpBinary)
-            for i in range(self.n) for j in range(self.n)
-        }
+        :return: base stations, locations and coefficients of the added pairs
+        """
+        is_open = np.asarray(locations, dtype=bool)
+        candidates = slice(0, self.candidate_count)
+        covered = np.zeros(self.n, dtype=bool)
+        covered[self.pair_rows[candidates][is_open[self.pair_cols[candidates]]]] = True
+        missing = np.flatnonzero(~covered)
+        sites = np.flatnonzero(is_open)
+        nearest = sites[self._distance_matrix()[np.ix_(missing, sites)].argmin(axis=1)] if len(missing) else missing
+        added = self.pair_rows[self.candidate_count:] * self.n + self.pair_cols[self.candidate_count:]
+        new = ~np.isin(missing * self.n + nearest, added)
+        missing, nearest = missing[new], nearest[new]
+        coefs = self._coefs(missing, nearest)
+        self.pair_rows = np.concatenate([self.pair_rows, missing])
+        self.pair_cols = np.concatenate([self.pair_cols, nearest])
+        self.ln_coefs = np.concatenate([self.ln_coefs, coefs])
+        return missing, nearest, coefs
 
-        # Objective function
-        prob += lpSum(self.ln_coefs[i, j] * variables[f"x_{i}_{j}"]
-                      for i in range(self.n) for j in range(self.n))
+    def update_locations(self, locations, centers):
+        """
+        Move the model from the old to the new locations by updating the bounds of the changed location variables.
 
-        # Constraints: sum of x_i,j over j equals 1 for each i
-        for i in range(self.n):
-            prob += lpSum(variables[f"x_{i}_{j}"] for j in range(self.n)) == 1
+        :return: number of changed locations
+        """
+        start = time.perf_counter()
+        changed = np.flatnonzero(np.asarray(locations) != np.asarray(centers))
+        self.model.set_locations(changed, np.asarray(centers)[changed])
+        if self.pruned:
+            self.model.add_pairs(*self._cover_open_locations(centers))
+        self.build_time += time.perf_counter() - start
+        return len(changed)
 
-        # Constraints: x_i,j <= y_j for each i, j
-        for l, y in enumerate(locations):
-            for i in range(self.n):
-                prob += variables[f"x_{i}_{l}"] <= y
+    def solve_assignment(self, locations, previous=None):
+        """
+        Assign every base station to one open location by solving the model for the given locations, warm-started
+        from the previous assignment: base stations whose location closed move to their best open candidate.
+
+        :return: assigned location of every base station
+        """
+        is_open = np.asarray(locations, dtype=bool)
+        start = time.perf_counter()
+        initial = None
+        if previous is not None:
+            # best open pair per base station, the previous pair where its location is still open
+            keys = np.where(is_open[self.pair_cols], self.ln_coefs, np.inf)
+            keys[is_open[previous[self.pair_rows]] & (self.pair_cols == previous[self.pair_rows])] = -np.inf
+            order = np.lexsort((keys, self.pair_rows))
+            first = order[np.r_[0, np.flatnonzero(np.diff(self.pair_rows[order])) + 1]]
+            initial = np.zeros(len(self.pair_rows))
+            initial[first] = 1
+        self.build_time += time.perf_counter() - start
 
-        return prob, variables
+        start = time.perf_counter()
+        values = self.model.solve(initial)
+        self.solve_time += time.perf_counter() - start
+
+        chosen = values > 0.5
+        solutions = np.full(self.n, -1)
+        solutions[self.pair_rows[chosen]] = self.pair_cols[chosen]
+        return solutions
 
     def process_result(self, solution, locations):
         base_stations = self.base_stations[:self.n]
@@ -121,8 +242,120 @@ class MIQPServerPlacer(ServerPlacer):
         edge_servers = [EdgeServer(i, base_stations[x].latitude, base_stations[x].longitude, base_stations[x].id)
                         for i, x in enumerate(positions)]
         for i, p in enumerate(positions):
-            for j in range(self.n):
-                if solution[j][p] == 1:
-                    edge_servers[i].assigned_base_stations.append(base_stations[j])
-                    edge_servers[i].workload += base_stations[j].workload
-        self.edge_servers = edge_servers
\ No newline at end of file
+            for j in np.flatnonzero(solution == p):
+                edge_servers[i].assigned_base_stations.append(base_stations[j])
+                edge_servers[i].workload += base_stations[j].workload
+        self.edge_servers = edge_servers
+
+
+class PulpAssignmentModel(object):
+    """
+    Assignment model kept as one PuLP problem, CBC reads it again on every solve.
+    """
+
+    def __init__(self, n, rows, cols, coefs, locations):
+        self.prob = LpProblem("MIQP", LpMinimize)
+        self.x = [LpVariable(f"x_{i}_{j}", cat=LpBinary) for i, j in zip(rows, cols)]
+        self.y = [LpVariable(f"y_{l}", lowBound=v, upBound=v, cat='Integer') for l, v in enumerate(locations)]
+
+        # Objective function
+        self.prob += LpAffineExpression(zip(self.x, coefs))
+
+        # Constraints: sum of x_i,j over j equals 1 for each i
+        order = np.argsort(rows, kind='stable')
+        bounds = np.searchsorted(rows[order], np.arange(n + 1))
+        for i in range(n):
+            self.prob += lpSum(self.x[p] for p in order[bounds[i]:bounds[i + 1]]) == 1, f"assign_{i}"
+
+        # Constraints: x_i,j <= y_j for each i, j
+        for var, l in zip(self.x, cols):
+            self.prob += var - self.y[l] <= 0
+
+    def set_locations(self, indices, values):
+        for l, v in zip(indices, values):
+            self.y[l].lowBound = self.y[l].upBound = int(v)
+
+    def add_pairs(self, rows, cols, coefs):
+        for i, l, coef in zip(rows, cols, coefs):
+            var = LpVariable(f"x_{i}_{l}_{len(self.x)}", cat=LpBinary)
+            self.x.append(var)
+            self.prob.objective.addterm(var, coef)
+            self.prob.constraints[f"assign_{i}"].addInPlace(var)
+            self.prob += var - self.y[l] <= 0
+
+    def solve(self, initial=None):
+        if initial is not None:
+            for var, v in zip(self.x, initial):
+                var.setInitialValue(v)
+            for var in self.y:
+                var.setInitialValue(var.lowBound)
+        self.prob.solve(PULP_CBC_CMD(msg=False, warmStart=initial is not None))
+        return np.array([var.varValue for var in self.x])
+
+
+class HighsAssignmentModel(object):
+    """
+    Assignment model living inside one HiGHS instance over the columns [x pairs, y locations, added x pairs].
+    """
+
+    def __init__(self, n, rows, cols, coefs, locations):
+        pairs = len(rows)
+        self.pairs = pairs
+        self.x_columns = np.arange(pairs)
+        self.y_columns = pairs + np.arange(n)
+        locations = np.asarray(locations, dtype=float)
+
+        # rows [0, n): sum_j x_i,j == 1, rows [n, n + pairs): x_i,j - y_j <= 0
+        link = n + np.arange(pairs)
+        matrix = sparse.csc_matrix((np.concatenate([np.ones(pairs), np.ones(pairs), -np.ones(pairs)]),
+                                    (np.concatenate([rows, link, link]),
+                                     np.concatenate([self.x_columns, self.x_columns, self.y_columns[cols]]))),
+                                   shape=(n + pairs, pairs + n))
+        lp = highspy.HighsLp()
+        lp.num_col_ = pairs + n
+        lp.num_row_ = n + pairs
+        lp.col_cost_ = np.concatenate([coefs, np.zeros(n)])
+        lp.col_lower_ = np.concatenate([np.zeros(pairs), locations])
+        lp.col_upper_ = np.concatenate([np.ones(pairs), locations])
+        lp.row_lower_ = np.concatenate([np.ones(n), np.full(pairs, -highspy.kHighsInf)])
+        lp.row_upper_ = np.concatenate([np.ones(n), np.zeros(pairs)])
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = matrix.indptr
+        lp.a_matrix_.index_ = matrix.indices
+        lp.a_matrix_.value_ = matrix.data
+        lp.integrality_ = [highspy.HighsVarType.kInteger] * (pairs + n)
+
+        self.h = highspy.Highs()
+        self.h.setOptionValue('output_flag', False)
+        self.h.passModel(lp)
+
+    def set_locations(self, indices, values):
+        values = np.asarray(values, dtype=float)
+        self.h.changeColsBounds(len(indices), self.y_columns[indices].astype(np.int32), values, values)
+
+    def add_pairs(self, rows, cols, coefs):
+        count = len(rows)
+        if not count:
+            return
+        first_column = self.h.getNumCol()
+        self.h.addCols(count, np.asarray(coefs, dtype=float), np.zeros(count), np.ones(count), count,
+                       np.arange(count, dtype=np.int32), np.asarray(rows, dtype=np.int32), np.ones(count))
+        columns = first_column + np.arange(count)
+        self.h.changeColsIntegrality(count, columns.astype(np.int32),
+                                     np.full(count, highspy.HighsVarType.kInteger.value, dtype=np.uint8))
+        indices = np.column_stack([columns, self.y_columns[cols]]).ravel().astype(np.int32)
+        self.h.addRows(count, np.full(count, -highspy.kHighsInf), np.zeros(count), 2 * count,
+                       np.arange(0, 2 * count, 2, dtype=np.int32), indices, np.tile([1.0, -1.0], count))
+        self.x_columns = np.concatenate([self.x_columns, columns])
+
+    def solve(self, initial=None):
+        if initial is not None:
+            solution = np.zeros(self.h.getNumCol())
+            solution[self.x_columns] = initial
+            lp = self.h.getLp()
+            solution[self.y_columns] = np.asarray(lp.col_lower_)[self.y_columns]
+            start = highspy.HighsSolution()
+            start.col_value = solution
+            self.h.setSolution(start)
+        self.h.run()
+        return np.asarray(self.h.getSolution().col_value)[self.x_columns]
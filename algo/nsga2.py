@@ -0,0 +1,196 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .ga import GAServerPlacer
+from .stopping import StoppingCriterion
+
+
+class NSGA2ServerPlacer(GAServerPlacer):
+    """
+    NSGA-II approach: one run returns the whole Pareto front of placements over
+    (average latency, workload standard deviation) and optionally the share of base stations within
+    coverage_radius km of an edge server, instead of a fixed weighted sum.
+
+    Individuals are sets of K sites as in GAServerPlacer and reuse its crossover and mutation. Survival ranks
+    parents and offspring together by fast non-dominated sorting and crowding distance. The placement built by
+    place_server is the front member closest to the ideal point, any other member can be built with select().
+    """
+    name = 'NSGA2'
+
+    def __init__(self, base_stations, distances, population_size=100, max_generations=100, mutation_rate=0.2,
+                 crossover_rate=0.9, coverage_radius=None, time_budget=None, seed=None,
+                 max_batch_elements=2 ** 25):
+        super().__init__(base_stations, distances, population_size=population_size, max_generations=max_generations,
+                         mutation_rate=mutation_rate, crossover_rate=crossover_rate, cache_size=0,
+                         time_budget=time_budget, seed=seed, elite_size=0, max_batch_elements=max_batch_elements)
+        self.coverage_radius = coverage_radius
+        self.objectives = None
+        self.ranks = None
+        self.crowding = None
+        self.front = None
+        self.front_objectives = None
+
+    @property
+    def objective_names(self):
+        names = ['latency', 'workload']
+        if self.coverage_radius is not None:
+            names.append('coverage')
+        return names
+
+    def evaluate_objectives(self, population):
+        """
+        Objectives of every individual in one batched pass, all minimized (coverage is stored negated).
+
+        :return: matrix of shape (individuals, objectives)
+        """
+        count, k = population.shape
+        result = np.empty((count, len(self.objective_names)))
+        for start, nearest, min_distance in self._nearest_sites(self.distance_matrix, population,
+                                                                self.max_batch_elements):
+            rows = slice(start, start + len(nearest))
+            offsets = np.arange(len(nearest))[:, None] * k
+            edge_server_workloads = np.bincount((nearest + offsets).ravel(),
+                                                weights=np.tile(self.workloads, len(nearest)),
+                                                minlength=len(nearest) * k).reshape(len(nearest), k)
+            result[rows, 0] = min_distance.mean(axis=1)
+            result[rows, 1] = edge_server_workloads.std(axis=1)
+        if self.coverage_radius is not None:
+            index = self.coverage_index(self.coverage_radius, self.num_base_stations)
+            result[:, 2] = -index.count_many(population) / self.num_base_stations
+        return result
+
+    @staticmethod
+    def non_dominated_sort(objectives):
+        """
+        Fast non-dominated sorting on a dominance matrix.
+
+        :return: front rank of every row (0 = Pareto front)
+        """
+        no_worse = (objectives[:, None, :] <= objectives[None, :, :]).all(axis=2)
+        better = (objectives[:, None, :] < objectives[None, :, :]).any(axis=2)
+        dominates = no_worse & better  # dominates[i, j]: i dominates j
+        dominated_count = dominates.sum(axis=0)
+        ranks = np.full(len(objectives), -1)
+        rank = 0
+        current = np.flatnonzero(dominated_count == 0)
+        while len(current):
+            ranks[current] = rank
+            dominated_count = dominated_count - dominates[current].sum(axis=0)
+            dominated_count[ranks >= 0] = -1
+            current = np.flatnonzero(dominated_count == 0)
+            rank += 1
+        return ranks
+
+    @staticmethod
+    def crowding_distance(objectives, ranks):
+        """
+        Crowding distance of every row within its front, boundary rows get infinity.
+        """
+        crowding = np.zeros(len(objectives))
+        for rank in np.unique(ranks):
+            members = np.flatnonzero(ranks == rank)
+            values = objectives[members]
+            order = np.argsort(values, axis=0, kind='stable')
+            ordered = np.take_along_axis(values, order, axis=0)
+            spread = ordered[-1] - ordered[0]
+            spread[spread == 0] = 1
+            gaps = np.zeros_like(values)
+            gaps[1:-1] = (ordered[2:] - ordered[:-2]) / spread
+            gaps[0] = gaps[-1] = np.inf
+            distance = np.zeros_like(values)
+            np.put_along_axis(distance, order, gaps, axis=0)
+            crowding[members] = distance.sum(axis=1)
+        return crowding
+
+    def evaluate_population(self):
+        self.objectives = self.evaluate_objectives(self.population)
+        self.ranks = self.non_dominated_sort(self.objectives)
+        self.crowding = self.crowding_distance(self.objectives, self.ranks)
+
+    def selection(self):
+        """
+        Binary crowded tournament: lower rank wins, ties go to the larger crowding distance.
+        """
+        tournaments = self.rng.integers(self.population_size, size=(self.population_size, 2))
+        first, second = tournaments[:, 0], tournaments[:, 1]
+        first_wins = ((self.ranks[first] < self.ranks[second]) |
+                      ((self.ranks[first] == self.ranks[second]) & (self.crowding[first] >= self.crowding[second])))
+        return self.population[np.where(first_wins, first, second)]
+
+    def update_population(self):
+        """
+        Breed offspring, then keep the best population_size of parents and offspring by rank and crowding.
+        """
+        offspring = self.mutation(self.crossover(self.selection()))
+        combined = np.concatenate([self.population, offspring])
+        objectives = np.concatenate([self.objectives, self.evaluate_objectives(offspring)])
+        ranks = self.non_dominated_sort(objectives)
+        crowding = self.crowding_distance(objectives, ranks)
+        survivors = np.lexsort((-crowding, ranks))[:self.population_size]
+        self.population = combined[survivors]
+        self.objectives = objectives[survivors]
+        self.ranks = self.non_dominated_sort(self.objectives)
+        self.crowding = self.crowding_distance(self.objectives, self.ranks)
+
+    def place_server(self, base_station_num, edge_server_num):
+        logging.info("{0}: Start running NSGA-II with N={1}, K={2}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), base_station_num, edge_server_num))
+        self.setup(base_station_num, edge_server_num)
+        self.stopping = StoppingCriterion(self.max_generations, self.time_budget)
+        self.stopping.start()
+
+        self.population = self._random_sites(self.population_size)
+        self.evaluate_population()
+        generation = 0
+        while not self.stopping.check(generation, 0):
+            self.update_population()
+            generation += 1
+            logging.info("Generation {0}/{1} - Pareto front size: {2}".format(
+                generation, self.max_generations, np.count_nonzero(self.ranks == 0)))
+
+        # Pareto front without duplicated site sets
+        front = np.flatnonzero(self.ranks == 0)
+        _, unique = np.unique(np.sort(self.population[front], axis=1), axis=0, return_index=True)
+        front = front[np.sort(unique)]
+        order = np.argsort(self.objectives[front, 0], kind='stable')
+        self.front = self.population[front[order]]
+        self.front_objectives = self.objectives[front[order]]
+
+        self.select(self.knee())
+        self.run_info = self.stopping.report()
+        self.run_info['front_size'] = len(self.front)
+        logging.info("{0}: End running NSGA-II ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                             self.run_info))
+
+    def knee(self):
+        """
+        Index of the front member closest to the ideal point after normalizing every objective to [0, 1].
+        """
+        values = self.front_objectives
+        spread = values.max(axis=0) - values.min(axis=0)
+        spread[spread == 0] = 1
+        normalized = (values - values.min(axis=0)) / spread
+        return int(np.argmin(np.linalg.norm(normalized, axis=1)))
+
+    def select(self, index):
+        """
+        Build the edge servers of one Pareto front member.
+        """
+        self.process_result(self.front[index])
+
+    def pareto_front(self) -> pd.DataFrame:
+        """
+        Compact table of the Pareto front: one row per placement with its objectives and base station ids.
+        """
+        table = pd.DataFrame(self.front_objectives, columns=self.objective_names)
+        if self.coverage_radius is not None:
+            table['coverage'] = -table['coverage']
+        base_stations = self.base_stations[:self.num_base_stations]
+        table['sites'] = [' '.join(str(base_stations[x].id) for x in np.sort(sites)) for sites in self.front]
+        return table
+
+    def export_front(self, path):
+        self.pareto_front().to_csv(path, index_label='front_index')
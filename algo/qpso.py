@@ -1,28 +1,41 @@
 # qpso.py
-import random
-import math
 import numpy as np
 import logging
-
+import time
 from datetime import datetime
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
 from typing import List
 
+from algo.checkpoint import Checkpoint
+from algo.coverage import CoverageIndex
+from algo.fitness_cache import FitnessCache
 from algo.server_placer import ServerPlacer
+from algo.stopping import StoppingCriterion
+from algo.surrogate import SurrogateSample
 from data.edge_server import EdgeServer
-from utils import DataUtils
 
 class QPSOServerPlacer(ServerPlacer):
     """
     QPSO approach for edge server placement based on potential user.
     Representasi partikel: vektor kontinu (dimensi = jumlah candidate base stations).
-    Solusi biner diperoleh dengan memilih tepat K kandidat (berdasarkan nilai tertinggi).
+    Solusi diperoleh dengan memilih tepat K kandidat (berdasarkan nilai tertinggi) sebagai array indeks.
+    Seluruh swarm diperbarui dan dievaluasi sekaligus sebagai matriks (swarm_size x N).
+
+    Island mode (islands > 1): beberapa swarm independen berjalan di proses worker yang berbagi matriks jarak
+    (shared memory, read-only). Setiap migration_interval iterasi, `migrants` partikel terbaik tiap island dikirim
+    ke island lain (topology 'ring' atau 'full') dan menggantikan partikel terburuk di sana.
     """
     name = 'QPSO'
-    
+
     def __init__(self, base_stations: List, distances: List[List[float]],
                  swarm_size=30, iterations=50, beta=0.75,
                  alpha_delay=0.5, beta_workload=0.3, gamma_potential=0.2,
-                 distance_threshold=10):
+                 distance_threshold=10, seed=None, max_batch_elements=2 ** 25,
+                 islands=1, migration_interval=10, migrants=2, topology='ring', processes=None,
+                 cache_size=10000, time_budget=None, stagnation_iterations=None, stagnation_epsilon=0.0,
+                 checkpoint_path=None, checkpoint_every=10,
+                 surrogate_fraction=None, surrogate_strata=10, surrogate_every=10):
         super().__init__(base_stations, distances)
         self.swarm_size = swarm_size
         self.iterations = iterations
@@ -31,81 +44,183 @@ class QPSOServerPlacer(ServerPlacer):
         self.beta_workload = beta_workload
         self.gamma_potential = gamma_potential
         self.distance_threshold = distance_threshold
+        self.seed = seed
+        self.max_batch_elements = max_batch_elements  # batas elemen (partikel x N x K) per batch evaluasi
+        self.islands = islands
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.topology = topology
+        self.processes = processes  # jumlah proses worker, default = jumlah island
+        # Cache nilai fungsi tujuan per himpunan kandidat terpilih (0 = nonaktif)
+        self.cache_size = cache_size
+        self.fitness_cache = FitnessCache(cache_size) if cache_size else None
+        # Anytime mode: batas waktu (detik) dan berhenti jika gbest tidak membaik > epsilon selama X iterasi
+        self.time_budget = time_budget
+        self.stagnation_iterations = stagnation_iterations
+        self.stagnation_epsilon = stagnation_epsilon
+        self.stopping = None
+        # Checkpoint state swarm setiap checkpoint_every iterasi, run dengan path yang sama melanjutkan dari sana
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint = None
+        # Mode surrogate: partikel dinilai pada sampel BS (terstratifikasi workload) yang membesar dari
+        # surrogate_fraction hingga seluruh BS, gbest dinilai ulang secara exact setiap surrogate_every iterasi
+        self.surrogate_fraction = surrogate_fraction
+        self.surrogate_strata = surrogate_strata
+        self.surrogate_every = surrogate_every
+        self.surrogate = None
         self.k = None  # jumlah edge server yang akan dipilih (di-assign pada place_server)
         self.N = len(self.base_stations)
-        
-        # Precompute matriks jarak antar candidate base stations menggunakan fungsi dari utils
-        self.distance_matrix = np.zeros((self.N, self.N))
-        for i in range(self.N):
-            for j in range(self.N):
-                self.distance_matrix[i, j] = DataUtils.calc_distance(
-                    self.base_stations[i].latitude, self.base_stations[i].longitude,
-                    self.base_stations[j].latitude, self.base_stations[j].longitude)
-    
-    def objective_function(self, particle_binary: List[int]) -> float:
+        self.rng = None
+
+        # Array per base station, dipotong sesuai N pada place_server
+        self.workloads = np.array([bs.workload for bs in self.base_stations], dtype=float)
+        self.potentials = np.array([getattr(bs, 'potential_user', 0) for bs in self.base_stations], dtype=float)
+        self.distance_matrix = None
+        self.coverage = None  # BS dalam distance_threshold dari tiap kandidat
+
+        # State swarm
+        self.swarm = None
+        self.pbest = None
+        self.pbest_indices = None
+        self.pbest_obj = None
+        self.gbest = None
+        self.gbest_indices = None
+        self.gbest_obj = None
+        self.iteration = 0
+        self.island_best = None
+
+    def evaluate(self, selected: np.ndarray, exact=False) -> np.ndarray:
         """
-        Menghitung nilai fungsi tujuan berdasarkan:
+        Menghitung nilai fungsi tujuan untuk sekumpulan solusi sekaligus berdasarkan:
           - Average delay (rata-rata jarak antara setiap BS dengan server terdekat)
           - Workload imbalance antar edge server
           - Potential user coverage (nilai potential BS yang terpilih)
         Formula:
             obj = alpha_delay * avg_delay + beta_workload * workload_imbalance - gamma_potential * potential_coverage
+
+        Pada mode surrogate (kecuali exact=True) hanya sampel BS yang dihitung, dengan bobot per BS sampel.
+
+        :param selected: indeks kandidat terpilih dengan shape (jumlah solusi, K)
+        :param exact: abaikan sampel surrogate
+        :return: nilai fungsi tujuan tiap solusi
+        """
+        selected = np.atleast_2d(selected)
+        count, k = selected.shape
+        result = np.empty(count)
+        rows, weights, workloads = None, np.ones(self.N), self.workloads
+        if self.surrogate is not None and not exact:
+            rows, weights = self.surrogate.rows, self.surrogate.weights
+            workloads = self.workloads[rows] * weights
+        for start, nearest, min_distance in self._nearest_sites(self.distance_matrix, selected,
+                                                                self.max_batch_elements, rows):
+            chunk = selected[start:start + len(nearest)]
+            # Penalti untuk BS yang tidak tercakup kandidat terpilih dalam threshold
+            covered = self.coverage.covered_masks(chunk, rows)
+            min_distance = np.where(covered, min_distance, min_distance * 10)
+            avg_delay = min_distance @ weights / self.N
+
+            offsets = np.arange(len(chunk))[:, None] * k
+            workloads_es = np.bincount((nearest + offsets).ravel(), weights=np.tile(workloads, len(chunk)),
+                                       minlength=len(chunk) * k).reshape(len(chunk), k)
+            workload_imbalance = workloads_es.max(axis=1) - workloads_es.min(axis=1)
+            potential_coverage = self.potentials[chunk].sum(axis=1)
+
+            result[start:start + len(chunk)] = (self.alpha_delay * avg_delay +
+                                                self.beta_workload * workload_imbalance -
+                                                self.gamma_potential * potential_coverage)
+        return result
+
+    def evaluate_cached(self, selected: np.ndarray) -> np.ndarray:
+        """
+        Seperti evaluate, tetapi himpunan kandidat yang pernah dievaluasi diambil dari fitness cache.
+        """
+        if self.fitness_cache is None:
+            return self.evaluate(selected)
+        return self.fitness_cache.evaluate(selected, self.evaluate)
+
+    def objective_function(self, particle_binary: List[int]) -> float:
+        """
+        Nilai fungsi tujuan untuk satu solusi biner (panjang N, tepat K angka 1).
         """
-        selected_indices = [i for i, bit in enumerate(particle_binary) if bit == 1]
+        selected_indices = np.flatnonzero(particle_binary)
         if len(selected_indices) == 0:
             return float('inf')
-        
-        total_delay = 0
-        workload_dict = {i: 0 for i in selected_indices}
-        for i in range(self.N):
-            # Hitung jarak ke setiap server candidate yang terpilih
-            dists = [self.distance_matrix[i, j] for j in selected_indices]
-            min_distance = min(dists)
-            if min_distance > self.distance_threshold:
-                min_distance *= 10  # Penalti jika melebihi threshold
-            total_delay += min_distance
-            assigned_idx = selected_indices[dists.index(min_distance)]
-            workload_dict[assigned_idx] += self.base_stations[i].workload
-        
-        avg_delay = total_delay / self.N
-        workloads = list(workload_dict.values())
-        workload_imbalance = max(workloads) - min(workloads) if workloads else 0
-        potential_coverage = sum([self.base_stations[i].potential_user for i in selected_indices])
-        
-        obj = (self.alpha_delay * avg_delay +
-               self.beta_workload * workload_imbalance -
-               self.gamma_potential * potential_coverage)
-        return obj
-
-    def repair_particle(self, particle_binary: List[int]) -> List[int]:
-        """
-        Memastikan bahwa solusi biner memiliki tepat self.k angka 1.
-        Jika lebih, secara acak diubah menjadi 0; jika kurang, secara acak ditambahkan 1.
-        """
-        ones = sum(particle_binary)
-        if ones > self.k:
-            indices = [i for i, bit in enumerate(particle_binary) if bit == 1]
-            remove_count = ones - self.k
-            remove_indices = random.sample(indices, remove_count)
-            for idx in remove_indices:
-                particle_binary[idx] = 0
-        elif ones < self.k:
-            indices = [i for i, bit in enumerate(particle_binary) if bit == 0]
-            add_count = self.k - ones
-            add_indices = random.sample(indices, add_count)
-            for idx in add_indices:
-                particle_binary[idx] = 1
-        return particle_binary
-
-    def continuous_to_binary(self, particle_continuous: np.ndarray) -> List[int]:
-        """
-        Mengubah vektor kontinu menjadi solusi biner dengan memilih self.k indeks dengan nilai tertinggi.
-        """
-        indices = np.argsort(particle_continuous)[-self.k:]
-        binary = [0] * self.N
-        for idx in indices:
-            binary[idx] = 1
-        return binary
+        return self.evaluate(selected_indices[None, :])[0]
+
+    def continuous_to_indices(self, swarm: np.ndarray) -> np.ndarray:
+        """
+        Mengubah matriks posisi kontinu menjadi indeks self.k kandidat dengan nilai tertinggi tiap partikel.
+        """
+        return np.argpartition(swarm, self.N - self.k, axis=1)[:, self.N - self.k:]
+
+    def init_swarm(self):
+        """
+        Inisialisasi swarm: setiap partikel adalah vektor kontinu dengan nilai acak [0,1]
+        """
+        self.swarm = self.rng.random((self.swarm_size, self.N))
+        self.pbest = self.swarm.copy()
+        self.pbest_indices = self.continuous_to_indices(self.pbest)
+        self.pbest_obj = self.evaluate_cached(self.pbest_indices)
+
+        gbest_index = np.argmin(self.pbest_obj)
+        self.gbest = self.pbest[gbest_index].copy()
+        self.gbest_indices = self.pbest_indices[gbest_index].copy()
+        self.gbest_obj = self.pbest_obj[gbest_index]
+        self.iteration = 0
+
+    def update_swarm(self):
+        """
+        Satu iterasi QPSO untuk seluruh swarm sekaligus.
+        """
+        mbest = self.pbest.mean(axis=0)
+        u = self.rng.random((self.swarm_size, self.N))
+        u[u == 0] = 1e-10
+        sign = np.where(self.rng.random((self.swarm_size, self.N)) < 0.5, 1, -1)
+        self.swarm = np.clip(mbest + sign * self.beta * np.abs(self.pbest - mbest) * np.log(1 / u), 0, 1)
+
+        indices = self.continuous_to_indices(self.swarm)
+        obj = self.evaluate_cached(indices)
+        improved = obj < self.pbest_obj
+        self.pbest_obj[improved] = obj[improved]
+        self.pbest[improved] = self.swarm[improved]
+        self.pbest_indices[improved] = indices[improved]
+
+        best = np.argmin(obj)
+        if obj[best] < self.gbest_obj:
+            self.gbest_obj = obj[best]
+            self.gbest = self.swarm[best].copy()
+            self.gbest_indices = indices[best].copy()
+        self.iteration += 1
+
+    def get_state(self) -> dict:
+        """
+        State swarm lengkap (termasuk RNG) untuk dipindahkan antar proses.
+        """
+        return {
+            'swarm': self.swarm, 'pbest': self.pbest, 'pbest_indices': self.pbest_indices,
+            'pbest_obj': self.pbest_obj, 'gbest': self.gbest, 'gbest_indices': self.gbest_indices,
+            'gbest_obj': self.gbest_obj, 'iteration': self.iteration, 'rng': self.rng,
+        }
+
+    def set_state(self, state: dict):
+        for key, val in state.items():
+            setattr(self, key, val)
+
+    def setup(self, base_station_num, edge_server_num):
+        """
+        Menyiapkan data untuk subset base stations sesuai parameter.
+        """
+        self.k = edge_server_num
+        self.N = base_station_num
+        self.distance_matrix = self._distance_matrix()[:self.N, :self.N]
+        self.workloads = np.array([bs.workload for bs in self.base_stations[:self.N]], dtype=float)
+        self.coverage = self.coverage_index(self.distance_threshold, self.N)
+        self.potentials = np.array([getattr(bs, 'potential_user', 0) for bs in self.base_stations[:self.N]],
+                                   dtype=float)
+        self.rng = np.random.default_rng(self.seed)
+        if self.fitness_cache is not None:
+            self.fitness_cache.clear()
 
     def place_server(self, base_station_num, edge_server_num):
         """
@@ -114,66 +229,246 @@ class QPSOServerPlacer(ServerPlacer):
         """
         logging.info("{0}: Start running QPSO with N={1}, K={2}".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                                                                           base_station_num, edge_server_num))
-        # Gunakan subset base stations sesuai parameter
-        self.k = edge_server_num
-        self.N = base_station_num
-        self.base_stations = self.base_stations[:base_station_num]
-        self.distance_matrix = self.distance_matrix[:base_station_num, :base_station_num]
-        
-        # Inisialisasi swarm: setiap partikel adalah vektor kontinu dengan nilai acak [0,1]
-        swarm = [np.random.rand(self.N) for _ in range(self.swarm_size)]
-        pbest_cont = [p.copy() for p in swarm]
-        pbest_binary = [self.continuous_to_binary(p.copy()) for p in swarm]
-        pbest_obj = [self.objective_function(self.repair_particle(pb.copy())) for pb in pbest_binary]
-        
-        gbest_index = np.argmin(pbest_obj)
-        gbest_cont = pbest_cont[gbest_index].copy()
-        gbest_binary = pbest_binary[gbest_index].copy()
-        gbest_obj = pbest_obj[gbest_index]
-        
-        # Iterasi QPSO
-        for it in range(self.iterations):
-            mbest = np.mean(pbest_cont, axis=0)
-            for i in range(self.swarm_size):
-                for d in range(self.N):
-                    u = random.random() or 1e-10
-                    sign = 1 if random.random() < 0.5 else -1
-                    new_val = mbest[d] + sign * self.beta * abs(pbest_cont[i][d] - mbest[d]) * math.log(1/u)
-                    swarm[i][d] = max(0, min(1, new_val))
-                particle_binary = self.continuous_to_binary(swarm[i])
-                particle_binary = self.repair_particle(particle_binary)
-                obj_val = self.objective_function(particle_binary)
-                if obj_val < pbest_obj[i]:
-                    pbest_obj[i] = obj_val
-                    pbest_cont[i] = swarm[i].copy()
-                    pbest_binary[i] = particle_binary.copy()
-                if obj_val < gbest_obj:
-                    gbest_obj = obj_val
-                    gbest_cont = swarm[i].copy()
-                    gbest_binary = particle_binary.copy()
+        self.setup(base_station_num, edge_server_num)
+        self.stopping = StoppingCriterion(self.iterations, self.time_budget, self.stagnation_iterations,
+                                          self.stagnation_epsilon)
+        self.stopping.start()
+        self.checkpoint = Checkpoint(self.checkpoint_path, self.checkpoint_every,
+                                     {'n': self.N, 'k': self.k, 'seed': self.seed})
+        if self.islands > 1:
+            if self.surrogate_fraction is not None:
+                raise ValueError("Surrogate evaluation is not supported in island mode")
+            self.run_islands()
+        else:
+            self.run_swarm()
+        # Run selesai, checkpoint dihapus agar run berikutnya tidak melanjutkan swarm yang sudah selesai
+        self.checkpoint.finish()
+
+        self.process_result(self.gbest_indices)
+        self.run_info = self.stopping.report()
+        if self.checkpoint_path is not None:
+            self.run_info.update(self.checkpoint.report())
+        if self.surrogate is not None:
+            self.run_info.update(self.surrogate.report())
+        logging.info("{0}: End running QPSO ({1})".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                          self.run_info))
+
+    def run_swarm(self):
+        """
+        Iterasi QPSO satu swarm sampai salah satu kriteria berhenti terpenuhi.
+        """
+        self.surrogate = None
+        if self.surrogate_fraction is not None:
+            self.surrogate = SurrogateSample(self.workloads, self.surrogate_fraction, self.surrogate_strata,
+                                             self.surrogate_every, None if self.seed is None else [self.seed, 1])
+            self.surrogate.draw(0, self.iterations)
+        if self.checkpoint.exists():
+            # sampel surrogate ikut dipulihkan dari checkpoint
+            self.set_state(self.load_checkpoint()[0])
+        else:
+            self.init_swarm()
+        while not self.stopping.check(self.iteration, self.gbest_obj):
+            if self.surrogate is not None and self.iteration and self.surrogate.due(self.iteration):
+                self.refresh_surrogate()
+            self.update_swarm()
             logging.info("{0}: QPSO Iteration {1}/{2}, best objective = {3}".format(
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'), it+1, self.iterations, gbest_obj))
-        
-        # Bangun edge server dari kandidat yang terpilih
-        selected_indices = [i for i, bit in enumerate(gbest_binary) if bit == 1]
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.iteration, self.iterations, self.gbest_obj))
+            if self.checkpoint.due(self.iteration):
+                self.save_checkpoint([self.get_state()])
+        if self.surrogate is not None:
+            self.finish_surrogate()
+        if self.fitness_cache is not None:
+            logging.info("{0}: QPSO fitness cache {1}".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                              self.fitness_cache.stats()))
+
+    def refresh_surrogate(self):
+        """
+        Menilai gbest secara exact (mencatat error estimasi), mengambil sampel baru yang lebih besar,
+        lalu menilai ulang pbest dan gbest pada sampel baru agar perbandingan tetap konsisten.
+        """
+        exact = self.evaluate(self.gbest_indices[None, :], exact=True)[0]
+        self.surrogate.record_error(self.gbest_obj, exact)
+        self.surrogate.draw(self.iteration, self.iterations)
+        if self.fitness_cache is not None:
+            self.fitness_cache.clear()
+        self.pbest_obj = self.evaluate_cached(self.pbest_indices)
+        self.gbest_obj = self.evaluate(self.gbest_indices[None, :])[0]
+        # Skala fitness berubah, referensi stagnasi diganti dengan nilai gbest pada sampel baru
+        self.stopping.rebase(self.gbest_obj)
+        logging.info("{0}: QPSO surrogate sample {1} BS, incumbent error {2:.4f}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), len(self.surrogate.rows), self.surrogate.errors[-1]))
+
+    def finish_surrogate(self):
+        """
+        Penilaian exact di akhir: gbest dan semua pbest, solusi exact terbaik menjadi gbest.
+        """
+        exact = self.evaluate(self.gbest_indices[None, :], exact=True)[0]
+        self.surrogate.record_error(self.gbest_obj, exact)
+        self.pbest_obj = self.evaluate(self.pbest_indices, exact=True)
+        best = np.argmin(self.pbest_obj)
+        self.gbest_obj = exact
+        if self.pbest_obj[best] < exact:
+            self.gbest_obj = self.pbest_obj[best]
+            self.gbest = self.pbest[best].copy()
+            self.gbest_indices = self.pbest_indices[best].copy()
+
+    def run_islands(self):
+        """
+        Menjalankan self.islands swarm di proses worker dengan migrasi periodik, lalu mengambil global best.
+        """
+        matrix = np.ascontiguousarray(self.distance_matrix)
+        shm = SharedMemory(create=True, size=matrix.nbytes)
+        try:
+            np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[:] = matrix
+            params = {key: getattr(self, key) for key in _ISLAND_PARAMS}
+            seeds = np.random.SeedSequence(self.seed).spawn(self.islands)
+            with Pool(self.processes or self.islands, initializer=_init_island,
+                      initargs=(shm.name, matrix.shape, matrix.dtype.str, self.workloads, self.potentials,
+                                self.k, params)) as pool:
+                if self.checkpoint.exists():
+                    states = self.load_checkpoint()
+                else:
+                    states = pool.map(_start_island, seeds)
+                while not self.stopping.check(states[0]['iteration'], min(state['gbest_obj'] for state in states)):
+                    epoch = min(self.migration_interval, self.iterations - states[0]['iteration'])
+                    deadline = None
+                    if self.time_budget is not None:
+                        deadline = time.time() + self.time_budget - self.stopping.elapsed
+                    states = pool.starmap(_run_island, [(state, epoch, deadline) for state in states])
+                    self.migrate(states)
+                    if self.checkpoint.due(states[0]['iteration']):
+                        self.save_checkpoint(states)
+                    logging.info("{0}: QPSO Iteration {1}/{2}, island best objectives = {3}".format(
+                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'), states[0]['iteration'], self.iterations,
+                        [state['gbest_obj'] for state in states]))
+        finally:
+            shm.close()
+            shm.unlink()
+
+        best = min(states, key=lambda state: state['gbest_obj'])
+        self.set_state(best)
+        self.island_best = [state['gbest_obj'] for state in states]
+
+    def migrate(self, states: List[dict]):
+        """
+        Mengirim partikel pbest terbaik tiap island ke island tujuan sesuai topology,
+        partikel migran menggantikan pbest terburuk island tujuan jika lebih baik.
+        """
+        count = len(states)
+        outgoing = []
+        for state in states:
+            best = np.argsort(state['pbest_obj'])[:self.migrants]
+            outgoing.append((state['pbest'][best].copy(), state['pbest_indices'][best].copy(),
+                             state['pbest_obj'][best].copy()))
+
+        for target, state in enumerate(states):
+            if self.topology == 'ring':
+                sources = [(target - 1) % count]
+            elif self.topology == 'full':
+                sources = [source for source in range(count) if source != target]
+            else:
+                raise ValueError("Unknown topology: {0}".format(self.topology))
+            positions = np.concatenate([outgoing[source][0] for source in sources])
+            indices = np.concatenate([outgoing[source][1] for source in sources])
+            obj = np.concatenate([outgoing[source][2] for source in sources])
+            incoming = np.argsort(obj)[:self.migrants]
+
+            worst = np.argsort(state['pbest_obj'])[::-1][:len(incoming)]
+            better = obj[incoming] < state['pbest_obj'][worst]
+            worst, incoming = worst[better], incoming[better]
+            state['pbest'][worst] = positions[incoming]
+            state['swarm'][worst] = positions[incoming]
+            state['pbest_indices'][worst] = indices[incoming]
+            state['pbest_obj'][worst] = obj[incoming]
+            if len(incoming) and obj[incoming[0]] < state['gbest_obj']:
+                state['gbest_obj'] = obj[incoming[0]]
+                state['gbest'] = positions[incoming[0]].copy()
+                state['gbest_indices'] = indices[incoming[0]].copy()
+
+    def checkpoint_settings(self) -> dict:
+        """
+        Setting yang harus sama agar checkpoint dapat dilanjutkan.
+        """
+        return {'N': self.N, 'k': self.k, 'swarm_size': self.swarm_size, 'seed': self.seed, 'islands': self.islands,
+                'beta': self.beta, 'alpha_delay': self.alpha_delay, 'beta_workload': self.beta_workload,
+                'gamma_potential': self.gamma_potential, 'distance_threshold': self.distance_threshold,
+                'surrogate_fraction': self.surrogate_fraction}
+
+    def save_checkpoint(self, states: List[dict]):
+        """
+        Menyimpan state semua swarm (array, RNG, iterasi) dan state kriteria berhenti.
+        """
+        arrays, swarms = {}, []
+        for i, state in enumerate(states):
+            for key in _STATE_ARRAYS:
+                arrays['{0}_{1}'.format(key, i)] = state[key]
+            swarms.append({'gbest_obj': float(state['gbest_obj']), 'iteration': state['iteration'],
+                           'rng': Checkpoint.rng_state(state['rng'])})
+        meta = {'iteration': states[0]['iteration'], 'settings': self.checkpoint_settings(),
+                'stopping': self.stopping.state(), 'swarms': swarms}
+        if self.surrogate is not None:
+            surrogate_arrays, meta['surrogate'] = self.surrogate.state()
+            arrays.update(surrogate_arrays)
+        self.checkpoint.save(states[0]['iteration'], arrays, meta)
+
+    def load_checkpoint(self) -> List[dict]:
+        arrays, meta = self.checkpoint.load(self.checkpoint_settings())
+        self.stopping.restore(meta['stopping'])
+        if self.surrogate is not None:
+            self.surrogate.restore(arrays, meta['surrogate'])
+        states = []
+        for i, swarm in enumerate(meta['swarms']):
+            state = {key: arrays['{0}_{1}'.format(key, i)] for key in _STATE_ARRAYS}
+            state.update({'gbest_obj': swarm['gbest_obj'], 'iteration': swarm['iteration'],
+                          'rng': Checkpoint.restore_rng(swarm['rng'])})
+            states.append(state)
+        return states
+
+    def process_result(self, selected_indices):
+        """
+        Bangun edge server dari kandidat yang terpilih, lalu setiap base station diassign ke edge server terdekat.
+        """
+        base_stations = self.base_stations[:self.N]
         edge_servers = []
-        for idx, bs_idx in enumerate(selected_indices):
-            bs = self.base_stations[bs_idx]
-            es = EdgeServer(idx, bs.latitude, bs.longitude, bs.id)
-            edge_servers.append(es)
-        
-        # Assignment: setiap base station diassign ke edge server terdekat
-        for bs in self.base_stations:
-            min_distance = float('inf')
-            assigned_es = None
-            for es in edge_servers:
-                d = DataUtils.calc_distance(bs.latitude, bs.longitude, es.latitude, es.longitude)
-                if d < min_distance:
-                    min_distance = d
-                    assigned_es = es
-            if assigned_es is not None:
-                assigned_es.assigned_base_stations.append(bs)
-                assigned_es.workload += bs.workload
-        
+        for idx, bs_idx in enumerate(np.sort(selected_indices)):
+            bs = base_stations[bs_idx]
+            edge_servers.append(EdgeServer(idx, bs.latitude, bs.longitude, bs.id))
+        self._assign_nearest(base_stations, edge_servers)
         self.edge_servers = edge_servers
-        logging.info("{0}: End running QPSO".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
\ No newline at end of file
+
+
+# Island worker: setiap proses worker menyimpan satu placer yang membaca matriks jarak dari shared memory
+_STATE_ARRAYS = ('swarm', 'pbest', 'pbest_indices', 'pbest_obj', 'gbest', 'gbest_indices')
+_ISLAND_PARAMS = ('swarm_size', 'beta', 'alpha_delay', 'beta_workload', 'gamma_potential', 'distance_threshold',
+                  'max_batch_elements', 'cache_size')
+_island = {}
+
+
+def _init_island(shm_name, shape, dtype, workloads, potentials, k, params):
+    shm = SharedMemory(name=shm_name)
+    placer = QPSOServerPlacer([], None, **params)
+    placer.distance_matrix = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    placer.workloads = workloads
+    placer.potentials = potentials
+    placer.N = shape[0]
+    placer.k = k
+    placer.coverage = CoverageIndex(placer.distance_matrix, workloads, placer.distance_threshold)
+    _island['shm'] = shm
+    _island['placer'] = placer
+
+
+def _start_island(seed: np.random.SeedSequence) -> dict:
+    placer = _island['placer']
+    placer.rng = np.random.default_rng(seed)
+    placer.init_swarm()
+    return placer.get_state()
+
+
+def _run_island(state: dict, iterations, deadline=None) -> dict:
+    placer = _island['placer']
+    placer.set_state(state)
+    for _ in range(iterations):
+        if deadline is not None and time.time() >= deadline:
+            break
+        placer.update_swarm()
+    return placer.get_state()
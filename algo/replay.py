@@ -0,0 +1,170 @@
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from algo.server_placer import ServerPlacer
+
+
+class LoadReplay(object):
+    """
+    Trace-driven replay of the realized edge server load of a placement.
+
+    Every request of the raw log (start time, end time, address) is mapped to the edge server its base station is
+    assigned to and clipped to the replayed period. Concurrency is computed exactly by a sweep over the sorted start
+    (+1) and end (-1) times of every edge server, an end at the same time as a start is processed first, so sessions
+    that only touch are not concurrent. Peak, mean and percentiles are taken over time from that step curve. With a
+    `resolution` (seconds) the curve is also downsampled afterwards to the peak of every time bucket (self.series).
+    The log is read in chunks of `chunk_size` rows. The mapped events of every chunk are grouped by edge server and
+    spilled to a temporary directory, the sweep then loads the events of one edge server at a time, so memory holds
+    one chunk while reading and one edge server's events while sweeping instead of the whole log.
+    """
+
+    def __init__(self, placer: ServerPlacer, resolution=None, chunk_size=500000, percentiles=(50, 95, 99)):
+        assert placer.edge_servers
+        self.edge_servers = placer.edge_servers
+        self.resolution = resolution
+        self.chunk_size = chunk_size
+        self.percentiles = percentiles
+        self.address_to_server = {bs.address: j for j, es in enumerate(self.edge_servers)
+                                  for bs in es.assigned_base_stations}
+        self.requests = np.zeros(len(self.edge_servers), dtype=np.int64)
+        self.dropped = 0
+        self.start = None
+        self.end = None
+        self.series = None  # peak concurrency of every edge server per resolution bucket
+
+    def replay(self, path: str, start=None, end=None) -> pd.DataFrame:
+        """
+        Replay a request log against the placement
+
+        :param path: Path to the CSV file with 'address', 'start time' and 'end time' columns.
+        :param start: Start of the replayed period, the first request by default.
+        :param end: End of the replayed period, the last request by default.
+        :return: peak and percentile concurrent sessions of every edge server
+        """
+        logging.info("{0}: Start replaying {1} on K={2}".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                               path, len(self.edge_servers)))
+        if start is None or end is None:
+            first, last = self._time_range(path)
+            start = first if start is None else start
+            end = last if end is None else end
+        self.start, self.end = pd.Timestamp(start), pd.Timestamp(end)
+
+        self.requests[:] = 0
+        self.dropped = 0
+        with tempfile.TemporaryDirectory() as directory:
+            spills = [self._spill(directory, i, *self._sessions(chunk)) for i, chunk in enumerate(self._read(path))]
+            records = self._summarize(spills)
+        logging.info("{0}: End replaying, {1} requests, {2} dropped".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.requests.sum(), self.dropped))
+        return records
+
+    def _read(self, path):
+        return pd.read_csv(path, usecols=['address', 'start time', 'end time'],
+                           parse_dates=['start time', 'end time'], chunksize=self.chunk_size)
+
+    def _time_range(self, path):
+        first, last = None, None
+        for chunk in self._read(path):
+            chunk_first, chunk_last = chunk['start time'].min(), chunk['end time'].max()
+            first = chunk_first if first is None else min(first, chunk_first)
+            last = chunk_last if last is None else max(last, chunk_last)
+        return first, last
+
+    def _sessions(self, chunk: pd.DataFrame):
+        """
+        Edge server and clipped start / end (seconds into the replayed period) of the valid requests of a chunk.
+        Requests from unmapped addresses, ending before they start or entirely outside the period are dropped.
+        """
+        servers = chunk['address'].map(self.address_to_server)
+        begin = (chunk['start time'] - self.start).dt.total_seconds().to_numpy()
+        finish = (chunk['end time'] - self.start).dt.total_seconds().to_numpy()
+        period = (self.end - self.start).total_seconds()
+        valid = (servers.notna().to_numpy() & (finish >= begin) & (finish >= 0) & (begin <= period))
+        self.dropped += int(np.count_nonzero(~valid))
+
+        servers = servers.to_numpy()[valid].astype(np.int64)
+        self.requests += np.bincount(servers, minlength=len(self.edge_servers))
+        return servers, np.clip(begin[valid], 0, period), np.clip(finish[valid], 0, period)
+
+    def _spill(self, directory, index, servers, begin, finish):
+        """
+        Write the start (+1) and end (-1) events of a chunk grouped by edge server to a .npy file
+
+        :return: file path and the offsets of every edge server's events in it
+        """
+        active = finish > begin  # zero-length sessions are counted as requests but never active
+        servers = np.concatenate([servers[active], servers[active]])
+        events = np.stack([np.concatenate([begin[active], finish[active]]),
+                           np.concatenate([np.ones(np.count_nonzero(active)), -np.ones(np.count_nonzero(active))])])
+        order = np.argsort(servers, kind='stable')
+        path = os.path.join(directory, '{0}.npy'.format(index))
+        np.save(path, events[:, order])
+        return path, np.searchsorted(servers[order], np.arange(len(self.edge_servers) + 1))
+
+    def _sweep(self, spills, j):
+        """
+        Exact concurrency step curve of edge server j from its spilled events of every chunk.
+
+        :return: time and concurrency after every event, sorted by time
+        """
+        events = [np.load(path, mmap_mode='r')[:, bounds[j]:bounds[j + 1]] for path, bounds in spills]
+        events = np.concatenate(events, axis=1) if events else np.zeros((2, 0))
+        times, signs = events[0], events[1].astype(np.int64)
+        order = np.lexsort((signs, times))  # an end at the same time as a start goes first
+        return times[order], np.cumsum(signs[order])
+
+    def _summarize(self, spills) -> pd.DataFrame:
+        period = (self.end - self.start).total_seconds()
+        k = len(self.edge_servers)
+        peak, peak_time, mean = np.zeros(k, dtype=np.int64), np.zeros(k), np.zeros(k)
+        percentiles = np.zeros((len(self.percentiles), k))
+        if self.resolution:
+            buckets = max(1, int(np.ceil(period / self.resolution)))
+            self.series = np.zeros((k, buckets), dtype=np.int64)
+        for j in range(k):
+            t, values = self._sweep(spills, j)
+            if not len(t):
+                continue
+            # step curve: 0 before the first event, values[i] from t[i] until the next event
+            levels = np.concatenate([[0], values])
+            durations = np.diff(np.concatenate([[0], t, [period]]))
+            peak[j] = values.max()
+            peak_time[j] = t[values.argmax()]
+            mean[j] = levels @ durations / period if period > 0 else 0
+            order = np.argsort(levels, kind='stable')
+            cumulative = np.cumsum(durations[order])
+            for i, q in enumerate(self.percentiles):
+                position = min(np.searchsorted(cumulative, q / 100 * cumulative[-1]), len(order) - 1)
+                percentiles[i, j] = levels[order[position]]
+            if self.resolution:
+                self.series[j] = self._downsample(t, values, buckets)
+
+        table = pd.DataFrame({
+            'edge_server': [es.id for es in self.edge_servers],
+            'base_station_id': [es.base_station_id for es in self.edge_servers],
+            'workload': [es.workload for es in self.edge_servers],
+            'requests': self.requests,
+            'peak': peak,
+            'peak_time': self.start + pd.to_timedelta(peak_time, unit='s'),
+            'mean': mean,
+        })
+        for q, values in zip(self.percentiles, percentiles):
+            table['p{0}'.format(q)] = values
+        return table
+
+    def _downsample(self, times, values, buckets) -> np.ndarray:
+        """
+        Peak of an exact step curve in every resolution bucket: the level at the start of the bucket or any level
+        reached inside it.
+        """
+        starts = np.arange(buckets) * self.resolution
+        at_start = np.searchsorted(times, starts, side='right') - 1
+        series = np.where(at_start >= 0, values[np.maximum(at_start, 0)], 0)
+        inside = np.minimum((times // self.resolution).astype(np.int64), buckets - 1)
+        np.maximum.at(series, inside, values)
+        return series
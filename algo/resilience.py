@@ -0,0 +1,123 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from algo.server_placer import ServerPlacer
+
+
+class ResilienceEvaluator(object):
+    """
+    Evaluates what happens to a placement when edge servers go down.
+
+    Every base station keeps its current edge server and, when that one fails, moves to the closest surviving edge
+    server. For single failures that is the second closest edge server, precomputed once, so all K failure
+    scenarios are derived together with scatter-adds instead of K re-assignments.
+    """
+
+    def __init__(self, placer: ServerPlacer):
+        assert placer.edge_servers
+        self.placer = placer
+        self.edge_servers = placer.edge_servers
+        self.base_stations = [bs for es in self.edge_servers for bs in es.assigned_base_stations]
+        if len(self.edge_servers) < 2:
+            raise ValueError("Resilience needs at least two edge servers")
+
+        self.workloads = np.array([bs.workload for bs in self.base_stations], dtype=float)
+        self.labels = np.repeat(np.arange(len(self.edge_servers)),
+                                [len(es.assigned_base_stations) for es in self.edge_servers])
+        self.distances = placer._site_distances(self.base_stations, self.edge_servers)
+
+        rows = np.arange(len(self.base_stations))
+        self.nearest_distance = self.distances[rows, self.labels]
+        backup = self.distances.copy()
+        backup[rows, self.labels] = np.inf
+        self.second = backup.argmin(axis=1)
+        self.second_distance = backup[rows, self.second]
+        self.loads = np.bincount(self.labels, weights=self.workloads, minlength=len(self.edge_servers))
+
+    def single_failures(self) -> pd.DataFrame:
+        """
+        Latency and workload metrics for every single edge server failure, most critical first
+
+        :return: criticality table with one row per failed edge server
+        """
+        logging.info("{0}: Start evaluating single failures with N={1}, K={2}".format(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), len(self.base_stations), len(self.edge_servers)))
+        n, k = len(self.base_stations), len(self.edge_servers)
+
+        # extra delay of every failure scenario
+        extra = np.bincount(self.labels, weights=self.second_distance - self.nearest_distance, minlength=k)
+        stations = np.bincount(self.labels, minlength=k)
+
+        # loads[j, l]: workload of edge server l after edge server j failed
+        moved = np.bincount(self.labels * k + self.second, weights=self.workloads, minlength=k * k).reshape(k, k)
+        loads = self.loads[None, :] + moved
+        np.fill_diagonal(loads, np.nan)
+
+        table = pd.DataFrame({
+            'edge_server': [es.id for es in self.edge_servers],
+            'base_station_id': [es.base_station_id for es in self.edge_servers],
+            'base_stations': stations,
+            'workload': self.loads,
+            'latency': (self.nearest_distance.sum() + extra) / n,
+            'latency_increase': extra / n,
+            'max_moved_delay': self._max_by_label(self.second_distance),
+            'max_workload': np.nanmax(loads, axis=1),
+            'workload_std': np.nanstd(loads, axis=1),
+        })
+        logging.info("{0}: End evaluating single failures".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        return table.sort_values('latency_increase', ascending=False, ignore_index=True)
+
+    def worst_case(self) -> dict:
+        """
+        Worst-case degradation over all single failures compared with the intact placement
+        """
+        table = self.single_failures()
+        return {
+            'latency': self.nearest_distance.mean(),
+            'worst_latency': table['latency'].max(),
+            'worst_latency_edge_server': table.loc[table['latency'].idxmax(), 'edge_server'],
+            'workload': np.std(self.loads),
+            'worst_workload': table['workload_std'].max(),
+            'max_workload': self.loads.max(),
+            'worst_max_workload': table['max_workload'].max(),
+        }
+
+    def sampled_failures(self, failure_num=2, samples=100, seed=0) -> pd.DataFrame:
+        """
+        Latency and workload metrics for randomly sampled simultaneous failures
+
+        :param failure_num: edge servers failing together in each scenario
+        :param samples: number of scenarios
+        :param seed: seed of the scenario sampler
+        :return: one row per scenario
+        """
+        k = len(self.edge_servers)
+        assert failure_num < k
+        rng = np.random.default_rng(seed)
+        order = np.argsort(self.distances, axis=1)
+        rows = np.arange(len(self.base_stations))
+
+        records = []
+        for _ in range(samples):
+            failed = rng.choice(k, failure_num, replace=False)
+            alive = np.ones(k, dtype=bool)
+            alive[failed] = False
+            # survivors keep their edge server, the others move to their closest alive edge server
+            fallback = order[rows, np.argmax(alive[order], axis=1)]
+            labels = np.where(alive[self.labels], self.labels, fallback)
+            loads = np.bincount(labels, weights=self.workloads, minlength=k)[alive]
+            records.append({
+                'failed': tuple(self.edge_servers[j].id for j in failed),
+                'latency': self.distances[rows, labels].mean(),
+                'max_workload': loads.max(),
+                'workload_std': np.std(loads),
+            })
+        return pd.DataFrame(records)
+
+    def _max_by_label(self, values: np.ndarray) -> np.ndarray:
+        result = np.zeros(len(self.edge_servers))
+        np.maximum.at(result, self.labels, values)
+        return result
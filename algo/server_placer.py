@@ -3,7 +3,12 @@ from datetime import datetime
 from typing import List, Iterable
 
 import numpy as np
+from sklearn.neighbors import BallTree
 
+from algo.assignment import BalancedAssignment
+from algo.coverage import CoverageIndex
+from algo.interchange import FastInterchange
+from algo.lower_bound import LagrangianBound
 from data.base_station import BaseStation
 from data.edge_server import EdgeServer
 from utils import DataUtils
@@ -15,6 +20,9 @@ class ServerPlacer(object):
         self.base_stations = base_stations.copy()
         self.edge_servers = None
         self.distances = distances
+        self._distance_array = None
+        self._coverage_index = None
+        self.run_info = None  # extra run details (e.g. stop reason) reported with the objectives
 
     def place_server(self, base_station_num, edge_server_num):
         raise NotImplementedError
@@ -27,16 +35,224 @@ class ServerPlacer(object):
         :param base_station: 
         :return: distance(km)
         """
-        if edge_server.base_station_id:
+        if edge_server.base_station_id is not None:
             return self.distances[edge_server.base_station_id][base_station.id]
         return DataUtils.calc_distance(edge_server.latitude, edge_server.longitude, base_station.latitude,
                                        base_station.longitude)
 
+    def _distance_matrix(self) -> np.ndarray:
+        """
+        The distance store as ndarray, converted once and shared by all vectorized helpers
+        
+        :return: distances(km) between base stations
+        """
+        if self._distance_array is None:
+            self._distance_array = np.asarray(self.distances, dtype=float)
+        return self._distance_array
+
+    def _site_distances(self, base_stations: List[BaseStation], edge_servers: List[EdgeServer]) -> np.ndarray:
+        """
+        Calculate distances between base stations and edge servers in one pass.
+        Edge servers placed on a base station read the distance store, the others fall back to vectorized haversine.
+        
+        :param base_stations: 
+        :param edge_servers: 
+        :return: distance(km) matrix of shape (len(base_stations), len(edge_servers))
+        """
+        bs_ids = np.array([bs.id for bs in base_stations], dtype=int)
+        result = np.empty((len(base_stations), len(edge_servers)))
+        on_site = [j for j, es in enumerate(edge_servers) if es.base_station_id is not None]
+        off_site = [j for j, es in enumerate(edge_servers) if es.base_station_id is None]
+        if on_site:
+            site_ids = np.array([edge_servers[j].base_station_id for j in on_site], dtype=int)
+            result[:, on_site] = self._distance_matrix()[np.ix_(bs_ids, site_ids)]
+        if off_site:
+            lat = np.array([bs.latitude for bs in base_stations])[:, None]
+            lng = np.array([bs.longitude for bs in base_stations])[:, None]
+            es_lat = np.array([edge_servers[j].latitude for j in off_site])[None, :]
+            es_lng = np.array([edge_servers[j].longitude for j in off_site])[None, :]
+            result[:, off_site] = DataUtils.calc_distances(es_lat, es_lng, lat, lng)
+        return result
+
+    def _assign_nearest(self, base_stations: List[BaseStation], edge_servers: List[EdgeServer]) -> np.ndarray:
+        """
+        Assign every base station to its closest edge server
+        
+        :param base_stations: 
+        :param edge_servers: 
+        :return: index of the assigned edge server for each base station
+        """
+        labels = self._site_distances(base_stations, edge_servers).argmin(axis=1)
+        self._apply_assignment(base_stations, edge_servers, labels)
+        return labels
+
+    def _assign_balanced(self, base_stations: List[BaseStation], edge_servers: List[EdgeServer], capacities=None,
+                         assigner: BalancedAssignment = None) -> np.ndarray:
+        """
+        Assign base stations to edge servers minimizing total distance subject to workload capacities,
+        an alternative to _assign_nearest
+        
+        :param base_stations: 
+        :param edge_servers: 
+        :param capacities: workload capacity of each edge server, average workload * 1.1 by default
+        :param assigner: configured BalancedAssignment
+        :return: index of the assigned edge server for each base station
+        """
+        assigner = assigner or BalancedAssignment()
+        workloads = np.array([bs.workload for bs in base_stations], dtype=float)
+        labels = assigner.assign(self._site_distances(base_stations, edge_servers), workloads, capacities)
+        self._apply_assignment(base_stations, edge_servers, labels)
+        return labels
+
+    def rebalance(self, capacities=None, assigner: BalancedAssignment = None):
+        """
+        Re-assign the base stations of the current placement under workload capacities, keeping the edge server sites
+        """
+        assert self.edge_servers
+        base_stations = sorted((bs for es in self.edge_servers for bs in es.assigned_base_stations),
+                               key=lambda x: x.id)
+        self._assign_balanced(base_stations, self.edge_servers, capacities, assigner)
+
+    def interchange(self, local_search: FastInterchange = None) -> dict:
+        """
+        Improve the sites of the current placement by fast interchange and re-assign the base stations to the
+        nearest edge server, edge servers that are not on one of the assigned base stations are snapped to one first
+
+        :param local_search: configured FastInterchange, latency only without time budget by default
+        :return: interchange run details, also merged into run_info
+        """
+        assert self.edge_servers
+        local_search = local_search or FastInterchange()
+        base_stations = sorted((bs for es in self.edge_servers for bs in es.assigned_base_stations),
+                               key=lambda x: x.id)
+        ids = np.array([bs.id for bs in base_stations], dtype=int)
+        # the reported placement is left as is, edge servers off a base station or on one outside the assigned base
+        # stations (e.g. random sites beyond the first N) are only snapped in the local site array
+        site_ids = np.array([-1 if es.base_station_id is None else es.base_station_id for es in self.edge_servers])
+        off_site = ~np.isin(site_ids, ids)
+        sites = np.zeros(len(self.edge_servers), dtype=int)
+        sites[~off_site] = np.searchsorted(ids, site_ids[~off_site])
+        if off_site.any():
+            # snapped to the base stations that are not already used by an edge server
+            free = np.setdiff1d(np.arange(len(base_stations)), sites[~off_site])
+            snapped = self._snap_to_base_stations(
+                np.array([(es.latitude, es.longitude) for es, x in zip(self.edge_servers, off_site) if x]),
+                [base_stations[x] for x in free])
+            sites[off_site] = free[snapped]
+
+        sites, info = local_search.improve(self._distance_matrix()[np.ix_(ids, ids)],
+                                           [bs.workload for bs in base_stations], sites)
+        edge_servers = [EdgeServer(i, base_stations[x].latitude, base_stations[x].longitude, base_stations[x].id)
+                        for i, x in enumerate(np.sort(sites))]
+        self._assign_nearest(base_stations, edge_servers)
+        self.edge_servers = edge_servers
+        self.run_info = {**(self.run_info or {}), **info}
+        return info
+
+    def latency_bound(self, base_station_num, edge_server_num, lower_bound: LagrangianBound = None) -> dict:
+        """
+        Lower bound of the latency objective of any placement of edge_server_num edge servers on the first
+        base_station_num base stations, the current placement starts the multipliers when it is on base stations
+
+        :param lower_bound: configured LagrangianBound
+        :return: bound and run details, see LagrangianBound.compute()
+        """
+        lower_bound = lower_bound or LagrangianBound()
+        sites = None
+        if self.edge_servers and all(es.base_station_id is not None and es.base_station_id < base_station_num
+                                     for es in self.edge_servers):
+            sites = [es.base_station_id for es in self.edge_servers]
+        distance_matrix = self._distance_matrix()[:base_station_num, :base_station_num]
+        return lower_bound.compute(distance_matrix, edge_server_num, sites=sites)
+
+    @staticmethod
+    def _apply_assignment(base_stations: List[BaseStation], edge_servers: List[EdgeServer], labels: np.ndarray):
+        """
+        Fill assigned_base_stations and workload of edge servers from an assignment vector
+        """
+        workloads = np.bincount(labels, weights=[bs.workload for bs in base_stations], minlength=len(edge_servers))
+        for es, workload in zip(edge_servers, workloads):
+            es.assigned_base_stations = []
+            es.workload = workload
+        for bs, label in zip(base_stations, labels):
+            edge_servers[label].assigned_base_stations.append(bs)
+
+    @staticmethod
+    def _nearest_sites(distance_matrix: np.ndarray, selected: np.ndarray, max_elements=2 ** 25, columns=None):
+        """
+        Nearest selected site of every base station for a batch of site sets, in chunks of at most max_elements
+        gathered distances (site sets x K x N)
+        
+        :param distance_matrix: symmetric distance(km) matrix of the candidate base stations
+        :param selected: site indices of shape (site sets, K)
+        :param columns: only these base stations (e.g. a sample), all by default
+        :return: generator of (first row, nearest site position, distance to it), both of shape (chunk rows, N)
+        """
+        count, k = selected.shape
+        n = distance_matrix.shape[1] if columns is None else len(columns)
+        batch = max(1, max_elements // (n * k))
+        for start in range(0, count, batch):
+            chunk = selected[start:start + batch]
+            # dists[p, j, i]: distance from the j-th selected site of set p to base station i
+            if columns is None:
+                dists = distance_matrix[chunk.ravel()].reshape(len(chunk), k, n)
+            else:
+                dists = distance_matrix[chunk.ravel()[:, None], columns[None, :]].reshape(len(chunk), k, n)
+            nearest = dists.argmin(axis=1)
+            yield start, nearest, np.take_along_axis(dists, nearest[:, None, :], axis=1)[:, 0, :]
+
+    def _snap_to_base_stations(self, coordinates: np.ndarray, base_stations: List[BaseStation]) -> np.ndarray:
+        """
+        Move every coordinate to its nearest base station, no base station is used twice.
+        Coordinates are snapped in order of their distance to the nearest candidate, a coordinate whose
+        nearest candidates are all taken looks further out in the spatial index.
+        
+        :param coordinates: (latitude, longitude) rows, at most len(base_stations)
+        :param base_stations: candidate sites
+        :return: index into base_stations for each coordinate
+        """
+        assert len(coordinates) <= len(base_stations)
+        candidates = np.radians([(bs.latitude, bs.longitude) for bs in base_stations])
+        tree = BallTree(candidates, metric='haversine')
+        points = np.radians(np.asarray(coordinates, dtype=float))
+        snapped = np.full(len(points), -1, dtype=int)
+        used = np.zeros(len(base_stations), dtype=bool)
+        k = min(8, len(base_stations))
+        pending = np.arange(len(points))
+        while len(pending):
+            dist, ind = tree.query(points[pending], k=k)
+            for row in np.argsort(dist[:, 0], kind='stable'):
+                free = ind[row][~used[ind[row]]]
+                if len(free):
+                    snapped[pending[row]] = free[0]
+                    used[free[0]] = True
+            pending = np.flatnonzero(snapped < 0)
+            k = min(k * 4, len(base_stations))
+        return snapped
+
+    def coverage_index(self, radius, base_station_num=None) -> CoverageIndex:
+        """
+        Bitset coverage of the first base_station_num base stations by each of them as candidate site,
+        built once per setting and reused by optimization loops
+        
+        :param radius: coverage radius(km)
+        :param base_station_num: 
+        """
+        n = base_station_num or len(self.base_stations)
+        index = self._coverage_index
+        if index is None or index.radius != radius or index.base_station_num != n:
+            workloads = [bs.workload for bs in self.base_stations[:n]]
+            index = CoverageIndex(self._distance_matrix()[:n, :n], workloads, radius)
+            self._coverage_index = index
+        return index
+
     def compute_objectives(self):
         objectives = {
             'latency': self.objective_latency(), 
             'workload': self.objective_workload()
         }
+        if self.run_info:
+            objectives.update(self.run_info)
         return objectives
 
     def objective_latency(self):
@@ -54,6 +270,15 @@ class ServerPlacer(object):
                 base_station_num += 1
         return total_delay / base_station_num
 
+    def objective_coverage(self, radius):
+        """
+        Calculate the share of base stations within radius(km) of an edge server
+        """
+        assert self.edge_servers
+        base_stations = [bs for es in self.edge_servers for bs in es.assigned_base_stations]
+        nearest = self._site_distances(base_stations, self.edge_servers).min(axis=1)
+        return np.count_nonzero(nearest <= radius) / len(base_stations)
+
     def objective_workload(self):
         """
         Calculate average edge server workload (Load standard deviation)
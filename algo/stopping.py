@@ -0,0 +1,70 @@
+import time
+
+
+class StoppingCriterion(object):
+    """
+    Decides when an iterative placer stops: after max_iterations, when the wall-clock time_budget (seconds) is used
+    up, or when the best objective has not improved by more than stagnation_epsilon for stagnation_iterations.
+    The reason and the number of iterations run are kept for reporting.
+    """
+
+    def __init__(self, max_iterations, time_budget=None, stagnation_iterations=None, stagnation_epsilon=0.0):
+        self.max_iterations = max_iterations
+        self.time_budget = time_budget
+        self.stagnation_iterations = stagnation_iterations
+        self.stagnation_epsilon = stagnation_epsilon
+        self.started = None
+        self.reference = None
+        self.improved_at = 0
+        self.iterations = 0
+        self.reason = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.reference = None
+        self.improved_at = 0
+        self.iterations = 0
+        self.reason = None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def check(self, iteration, best) -> bool:
+        """
+        :param iteration: iterations completed so far
+        :param best: best objective so far (smaller is better)
+        :return: whether to stop
+        """
+        self.iterations = iteration
+        if self.reference is None or best < self.reference - self.stagnation_epsilon:
+            self.reference = best
+            self.improved_at = iteration
+
+        if iteration >= self.max_iterations:
+            self.reason = 'iterations'
+        elif self.time_budget is not None and self.elapsed >= self.time_budget:
+            self.reason = 'time_budget'
+        elif self.stagnation_iterations is not None and iteration - self.improved_at >= self.stagnation_iterations:
+            self.reason = 'stagnation'
+        return self.reason is not None
+
+    def rebase(self, best):
+        """
+        Replace the stagnation reference after the objective scale changed (e.g. a new surrogate sample), without
+        counting it as an improvement
+        """
+        self.reference = best
+
+    def state(self) -> dict:
+        """
+        Stagnation bookkeeping, saved with checkpoints
+        """
+        return {'reference': self.reference, 'improved_at': self.improved_at}
+
+    def restore(self, state: dict):
+        self.reference = state['reference']
+        self.improved_at = state['improved_at']
+
+    def report(self) -> dict:
+        return {'stop_reason': self.reason, 'iterations': self.iterations, 'runtime': self.elapsed}
@@ -0,0 +1,72 @@
+import numpy as np
+
+from algo.checkpoint import Checkpoint
+
+
+class SurrogateSample(object):
+    """
+    Workload-stratified sample of base stations used to score candidate placements approximately.
+
+    Base stations are sorted by workload and split into `strata` equally sized groups, the same fraction is drawn
+    from every group and each sampled base station is weighted by group size / sampled count, so weighted sums over
+    the sample estimate sums over all base stations. The fraction grows linearly from start_fraction to 1 over the
+    run, a new sample is drawn every `refresh_every` iterations. The estimation error is tracked by comparing the
+    sampled and exact objective of the incumbent at every refresh.
+    """
+
+    def __init__(self, workloads, start_fraction=0.1, strata=10, refresh_every=10, seed=None):
+        self.workloads = np.asarray(workloads, dtype=float)
+        self.start_fraction = start_fraction
+        self.refresh_every = refresh_every
+        self.rng = np.random.default_rng(seed)
+        order = np.argsort(self.workloads, kind='stable')
+        self.strata = [group for group in np.array_split(order, min(strata, len(order))) if len(group)]
+        self.rows = None
+        self.weights = None
+        self.errors = []
+
+    def fraction(self, iteration, max_iterations):
+        progress = min(iteration / max_iterations, 1.0) if max_iterations else 1.0
+        return self.start_fraction + (1 - self.start_fraction) * progress
+
+    def due(self, iteration):
+        return iteration % self.refresh_every == 0
+
+    def draw(self, iteration, max_iterations):
+        """
+        Draw a new sample with the fraction scheduled for this iteration
+        """
+        fraction = self.fraction(iteration, max_iterations)
+        rows, weights = [], []
+        for group in self.strata:
+            size = max(1, int(round(fraction * len(group))))
+            rows.append(self.rng.choice(group, size, replace=False))
+            weights.append(np.full(size, len(group) / size))
+        rows = np.concatenate(rows)
+        order = np.argsort(rows)
+        self.rows = rows[order]
+        self.weights = np.concatenate(weights)[order]
+
+    def record_error(self, estimate, exact):
+        self.errors.append(abs(estimate - exact) / abs(exact) if exact else abs(estimate - exact))
+
+    def state(self) -> (dict, dict):
+        """
+        Current sample (arrays) and RNG state and errors (JSON-serializable), saved with checkpoints so a resumed
+        run scores on the same sample
+        """
+        return ({'surrogate_rows': self.rows, 'surrogate_weights': self.weights},
+                {'rng': Checkpoint.rng_state(self.rng), 'errors': [float(e) for e in self.errors]})
+
+    def restore(self, arrays: dict, meta: dict):
+        self.rows = arrays['surrogate_rows']
+        self.weights = arrays['surrogate_weights']
+        self.rng = Checkpoint.restore_rng(meta['rng'])
+        self.errors = list(meta['errors'])
+
+    def report(self) -> dict:
+        return {
+            'surrogate_sample': len(self.rows) if self.rows is not None else 0,
+            'surrogate_error': float(np.mean(self.errors)) if self.errors else 0.0,
+            'surrogate_error_max': float(np.max(self.errors)) if self.errors else 0.0,
+        }
@@ -0,0 +1,149 @@
+import itertools
+import logging
+import time
+from datetime import datetime
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+# Constructor argument that sets the run length of each tunable placer
+BUDGET_PARAMS = {'QPSO': 'iterations', 'GA': 'max_generations', 'NSGA2': 'max_generations'}
+
+
+class SuccessiveHalvingTuner(object):
+    """
+    Successive halving over placer settings: every configuration of the search space starts with min_budget
+    iterations, after each rung only the best 1/eta are promoted to a budget eta times larger, up to max_budget.
+
+    The search space maps constructor arguments to a list of values (sampled from the grid) or to a (low, high)
+    tuple (sampled uniformly, integers when both bounds are ints). Configurations are scored on the placer's
+    compute_objectives(), by one objective name or a callable on the objectives dict, so settings that change the
+    placer's internal objective weights are compared on the same footing. Runs of one rung execute in a process
+    pool.
+    """
+
+    def __init__(self, placer_class, base_stations, distances, space: dict, num_configs=27, min_budget=5,
+                 max_budget=None, eta=3, score='latency', fixed=None, budget_param=None, processes=None, seed=0):
+        """
+        :param placer_class: ServerPlacer subclass to tune
+        :param space: constructor argument -> list of values or (low, high) range
+        :param num_configs: configurations in the first rung
+        :param min_budget: iterations per configuration in the first rung
+        :param max_budget: iterations in the last rung, min_budget * eta^(rungs - 1) by default
+        :param score: objective name of compute_objectives() or callable(objectives) -> float, smaller is better
+        :param fixed: constructor arguments shared by all configurations (e.g. time_budget)
+        :param budget_param: constructor argument of the run length, looked up in BUDGET_PARAMS by default
+        :param processes: worker processes, one per core by default
+        """
+        self.placer_class = placer_class
+        self.base_stations = base_stations
+        self.distances = distances
+        self.space = space
+        self.num_configs = num_configs
+        self.min_budget = min_budget
+        self.eta = eta
+        self.max_budget = max_budget
+        if max_budget is None:
+            rungs = max(1, int(np.floor(np.log(num_configs) / np.log(eta))) + 1)
+            self.max_budget = min_budget * eta ** (rungs - 1)
+        self.score = score
+        self.fixed = fixed or {}
+        self.budget_param = budget_param or BUDGET_PARAMS[placer_class.name]
+        self.processes = processes
+        self.seed = seed
+        self.results = None
+
+    def sample_configs(self) -> list:
+        """
+        num_configs distinct configurations, the full grid when it is not larger than num_configs.
+        """
+        rng = np.random.default_rng(self.seed)
+        grid = {name: values for name, values in self.space.items() if not isinstance(values, tuple)}
+        ranges = {name: values for name, values in self.space.items() if isinstance(values, tuple)}
+        combinations = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+        if not ranges and len(combinations) <= self.num_configs:
+            return combinations
+
+        configs = []
+        for i in rng.permutation(max(self.num_configs, len(combinations)))[:self.num_configs]:
+            config = dict(combinations[i % len(combinations)])
+            for name, (low, high) in ranges.items():
+                if isinstance(low, int) and isinstance(high, int):
+                    config[name] = int(rng.integers(low, high + 1))
+                else:
+                    config[name] = float(rng.uniform(low, high))
+            configs.append(config)
+        return configs
+
+    def budgets(self) -> list:
+        budgets = [self.min_budget]
+        while budgets[-1] < self.max_budget:
+            budgets.append(min(budgets[-1] * self.eta, self.max_budget))
+        return budgets
+
+    def _score(self, objectives) -> float:
+        if callable(self.score):
+            return self.score(objectives)
+        return objectives[self.score]
+
+    def tune(self, base_station_num, edge_server_num) -> pd.DataFrame:
+        """
+        Run successive halving for one setting of N and K.
+
+        :return: ranked table, one row per configuration with its last rung, budget, score, objectives and runtime
+        """
+        configs = self.sample_configs()
+        alive = list(range(len(configs)))
+        records = {}
+        started = time.perf_counter()
+        with Pool(self.processes, initializer=_init_worker,
+                  initargs=(self.placer_class, self.base_stations, self.distances)) as pool:
+            for rung, budget in enumerate(self.budgets()):
+                tasks = [({**self.fixed, **configs[i], self.budget_param: budget}, base_station_num, edge_server_num)
+                         for i in alive]
+                for i, (objectives, runtime) in zip(alive, pool.starmap(_run_config, tasks)):
+                    records[i] = {**configs[i], 'rung': rung, 'budget': budget, 'score': self._score(objectives),
+                                  **objectives, 'runtime': runtime}
+                logging.info("{0}: Tuning rung {1} with budget {2}, best score {3}".format(
+                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'), rung, budget,
+                    min(records[i]['score'] for i in alive)))
+                if budget >= self.max_budget:
+                    break
+                keep = max(1, len(alive) // self.eta)
+                alive = sorted(alive, key=lambda i: records[i]['score'])[:keep]
+
+        results = pd.DataFrame([records[i] for i in range(len(configs))])
+        results = results.sort_values(['rung', 'score'], ascending=[False, True], kind='stable').reset_index(drop=True)
+        results.index.name = 'rank'
+        self.results = results
+        logging.info("{0}: Tuning finished in {1:.1f}s".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                              time.perf_counter() - started))
+        return results
+
+    def best_config(self) -> dict:
+        assert self.results is not None
+        best = {name: self.results[name].iloc[0] for name in self.space}
+        return {name: value.item() if isinstance(value, np.generic) else value for name, value in best.items()}
+
+
+# Tuning worker: every process builds its placers on its own copy of the data
+_worker = {}
+
+
+def _init_worker(placer_class, base_stations, distances):
+    _worker['placer_class'] = placer_class
+    _worker['base_stations'] = base_stations
+    _worker['distances'] = distances
+
+
+def _run_config(params, base_station_num, edge_server_num):
+    placer = _worker['placer_class'](_worker['base_stations'], _worker['distances'], **params)
+    start = time.perf_counter()
+    placer.place_server(base_station_num, edge_server_num)
+    runtime = time.perf_counter() - start
+    objectives = placer.compute_objectives()
+    # stopping details of the placer are already covered by budget and runtime
+    for key in ('stop_reason', 'iterations', 'runtime'):
+        objectives.pop(key, None)
+    return objectives, runtime
@@ -3,15 +3,14 @@ import numpy as np
 from sklearn.cluster import KMeans
 from datetime import datetime
 
-from data.edge_server import EdgeServer
+from .kmeans import KMeansServerPlacer
 
-from .server_placer import ServerPlacer
 
-
-class WeightedKMeansServerPlacer(ServerPlacer):
+class WeightedKMeansServerPlacer(KMeansServerPlacer):
     """
-    K-means approach
+    K-means approach, base stations weighted by workload
     """
+    name = 'WeightedKMeans'
 
     def place_server(self, base_station_num, edge_server_num):
         logging.info("{0}:Start running k-means with N={1}, K={2}".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -29,10 +28,5 @@ class WeightedKMeansServerPlacer(ServerPlacer):
         label = kmeans.labels_
 
         # process result
-        edge_servers = [EdgeServer(i, row[0], row[1]) for i, row in enumerate(centroid)]
-        for bs, es in enumerate(label):
-            edge_servers[es].assigned_base_stations.append(base_stations[bs])
-            edge_servers[es].workload += base_stations[bs].workload
-
-        self.edge_servers = list(filter(lambda x: x.workload != 0, edge_servers))
+        self.edge_servers = self._process_centroids(base_stations, centroid, label)
         logging.info("{0}:End running k-means".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
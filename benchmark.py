@@ -0,0 +1,125 @@
+import logging
+import os
+import random
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from algo.ga import GAServerPlacer
+from algo.mip import MIPServerPlacer
+from algo.miqp import MIQPServerPlacer
+from algo.qpso import QPSOServerPlacer
+from data.base_station import BaseStation
+from utils import DataUtils
+
+
+def synthetic_data(n, seed=0):
+    """
+    Random base stations around Shanghai with gamma distributed workloads, so benchmarks run without the dataset.
+
+    :return: base stations and their distance matrix (km)
+    """
+    rng = np.random.default_rng(seed)
+    lat = 31.2 + rng.normal(0, 0.08, n)
+    lng = 121.45 + rng.normal(0, 0.08, n)
+    base_stations = []
+    for i in range(n):
+        bs = BaseStation(id=i, addr='{0:.6f}/{1:.6f}'.format(lat[i], lng[i]), lat=lat[i], lng=lng[i])
+        bs.workload = rng.gamma(1.0, 500.0)
+        bs.num_users = int(rng.integers(1, 50))
+        base_stations.append(bs)
+    distances = DataUtils.calc_distances(lat[:, None], lng[:, None], lat[None, :], lng[None, :])
+    return base_stations, distances
+
+
+def bench_qpso_islands(n=3000, k=200, iterations=30, islands=(1, 2, 4, 8)):
+    """
+    Scaling of island mode QPSO. Every island runs a full swarm, so ideal scaling keeps the wall time constant
+    while the number of islands grows with the cores.
+    """
+    base_stations, distances = synthetic_data(n)
+    records = []
+    baseline = None
+    for count in islands:
+        placer = QPSOServerPlacer(base_stations, distances, iterations=iterations, seed=0, islands=count)
+        start = time.perf_counter()
+        placer.place_server(n, k)
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        processes = min(count, os.cpu_count())
+        speedup = count * baseline / seconds
+        records.append({'islands': count, 'processes': processes, 'seconds': seconds,
+                        'objective': placer.gbest_obj, 'speedup': speedup, 'efficiency': speedup / processes})
+    return pd.DataFrame(records)
+
+
+def bench_ga_generation(population_sizes=(30, 60, 120), base_station_nums=(500, 1000, 3000), k=100, generations=5):
+    """
+    Average GA generation time (batched fitness, selection, crossover, mutation) versus population size and N.
+    """
+    base_stations, distances = synthetic_data(max(base_station_nums))
+    records = []
+    for n in base_station_nums:
+        for population_size in population_sizes:
+            placer = GAServerPlacer(base_stations[:n], distances, population_size=population_size,
+                                    max_generations=generations, cache_size=0)
+            start = time.perf_counter()
+            placer.place_server(n, k)
+            seconds = time.perf_counter() - start
+            records.append({'num_base_stations': n, 'population_size': population_size,
+                            'generation_seconds': seconds / generations})
+    return pd.DataFrame(records)
+
+
+def bench_mip_backends(base_station_nums=(500, 1000, 3000), k=100, backends=('highs', 'pulp')):
+    """
+    Model build time versus solve time of the MIP backends (sparse matrices + HiGHS, PuLP + CBC).
+    """
+    base_stations, distances = synthetic_data(max(base_station_nums))
+    records = []
+    for n in base_station_nums:
+        for backend in backends:
+            placer = MIPServerPlacer(base_stations[:n], distances, backend=backend)
+            start = time.perf_counter()
+            placer.place_server(n, k)
+            seconds = time.perf_counter() - start
+            records.append({'num_base_stations': n, 'backend': backend, 'build_seconds': placer.run_info['build_time'],
+                            'solve_seconds': placer.run_info['solve_time'], 'total_seconds': seconds,
+                            'latency': placer.objective_latency() if placer.edge_servers else np.nan})
+    return pd.DataFrame(records)
+
+
+def bench_miqp_pruning(base_station_nums=(200, 500, 1000, 3000), k=50, neighbors=50, dense_limit=500):
+    """
+    Assignment variables, peak Python memory, build and solve time of MIQP with all n^2 pairs versus
+    k-nearest-neighbor pruned pairs. Dense runs are skipped above dense_limit base stations.
+    """
+    base_stations, distances = synthetic_data(max(base_station_nums))
+    records = []
+    for n in base_station_nums:
+        for mode in ('dense', 'pruned'):
+            if mode == 'dense' and n > dense_limit:
+                continue
+            placer = MIQPServerPlacer(base_stations[:n], distances, neighbors=neighbors if mode == 'pruned' else None)
+            random.seed(0)
+            tracemalloc.start()
+            start = time.perf_counter()
+            placer.place_server(n, k)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            records.append({'num_base_stations': n, 'mode': mode, 'variables': placer.run_info['variables'],
+                            'peak_memory_mb': peak / 2 ** 20, 'build_seconds': placer.run_info['build_time'],
+                            'solve_seconds': placer.run_info['solve_time'], 'total_seconds': seconds})
+    return pd.DataFrame(records)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    print('cores: {0}'.format(os.cpu_count()))
+    print(bench_qpso_islands().to_string(index=False))
+    print(bench_ga_generation().to_string(index=False))
+    print(bench_mip_backends().to_string(index=False))
+    print(bench_miqp_pruning().to_string(index=False))
@@ -11,6 +11,11 @@ from algo.weighted_kmeans import *
 from algo.topk import *
 from algo.qpso import QPSOServerPlacer
 from algo.ga import GAServerPlacer
+from algo.decomposition import DecompositionServerPlacer
+from algo.kmedoids import KMedoidsServerPlacer
+from algo.greedy import GreedyPMedianServerPlacer
+from algo.interchange import FastInterchange
+from algo.lower_bound import LagrangianBound
 from utils_all import *
 
 
@@ -27,22 +32,57 @@ def run_with_settings(placer, n, k, repeat_times=1):
             time.sleep(1)
             objectives_list.append(one_objectives)
 
-        objectives = {}
-        for k in objectives_list[-1].keys():
-            mean_value = sum(o[k] for o in objectives_list) / len(objectives_list)
-            objectives[k] = mean_value
+        # run details such as stop_reason are not numbers, the last run's value is kept
+        objectives = dict(objectives_list[-1])
+        for key, value in objectives_list[-1].items():
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                objectives[key] = sum(o[key] for o in objectives_list) / len(objectives_list)
     return objectives
 
-def run(placers, results_fpath='results/results_all.csv'):
+def run(placers, results_fpath='results/results_all.csv', interchange: FastInterchange = None,
+        lower_bound: LagrangianBound = None):
+    """
+    :param interchange: fast interchange post-processing, every placement is improved by it and reported again
+                        as '<placer>+FI'
+    :param lower_bound: Lagrangian latency bound of every setting, started from the best placement on base station
+                        sites and reported as latency_bound. The bound only holds for servers on the first n base
+                        stations, so the relative latency_gap is reported for those placements only, others (K-means
+                        and weighted K-means centroids, random sites beyond n before interchange) can lie below it
+    """
     n = 3000
     records = []
     for k in range(100, 600, 100):
         print(f'\nSettings: N={n}, K={k}')
+        setting_records = []
+        on_site_records = []  # placements on base station sites, the ones the bound holds for
+        best = None  # placer whose final placement on base station sites has the lowest latency
         for name, placer in placers.items():
             settings = {'num_base_stations': n, 'num_edge_servers': k, 'placer_name': name}
+            placer.run_info = None  # not every placer sets it, drop the interchange details of the last setting
             objectives = run_with_settings(placer, n, k)
             record = {**settings, **objectives}
-            records.append(record)
+            setting_records.append(record)
+            on_site = all(es.base_station_id is not None and es.base_station_id < n for es in placer.edge_servers)
+            if on_site:
+                on_site_records.append(record)
+            if interchange is not None:
+                placer.interchange(interchange)
+                objectives = placer.compute_objectives()
+                record = {**settings, 'placer_name': name + '+FI', **objectives}
+                setting_records.append(record)
+                on_site_records.append(record)
+                on_site = True
+            if on_site and (best is None or objectives['latency'] < best[0]):
+                best = (objectives['latency'], placer)
+        if lower_bound is not None and setting_records:
+            # without any placement on base station sites the bound starts from its own multipliers
+            bound = (best[1] if best is not None else next(iter(placers.values()))).latency_bound(n, k, lower_bound)
+            print(f'Latency lower bound: {bound["bound"]:.4f}')
+            for record in setting_records:
+                record['latency_bound'] = bound['bound']
+            for record in on_site_records:
+                record['latency_gap'] = record['latency'] / bound['bound'] - 1
+        records.extend(setting_records)
     pd_records = pd.DataFrame(records)
     pd_records.to_csv(results_fpath)
 
@@ -51,13 +91,17 @@ if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     data = DataUtils('./dataset/bs_all.csv', './dataset/data_all.csv')
     placers = {
-        # 'MIQP': MIQPServerPlacer(data.base_stations, data.distances),
+        'MIQP': MIQPServerPlacer(data.base_stations, data.distances, neighbors=50),
         'MIP': MIPServerPlacer(data.base_stations, data.distances),
         'K-means': KMeansServerPlacer(data.base_stations, data.distances),
         'Top-K': TopKServerPlacer(data.base_stations, data.distances),
         'Random': RandomServerPlacer(data.base_stations, data.distances),
         'weighted_k_means': WeightedKMeansServerPlacer(data.base_stations, data.distances),
+        'K-medoids': KMedoidsServerPlacer(data.base_stations, data.distances, seed=0),
+        # one greedy order serves the whole K sweep, every K extends the previous one
+        'Greedy-p-median': GreedyPMedianServerPlacer(data.base_stations, data.distances),
         # 'QPSO': QPSOServerPlacer(data.base_stations, data.distances),
-        # 'GA': GAServerPlacer(data.base_stations, data.distances)
+        # 'GA': GAServerPlacer(data.base_stations, data.distances),
+        # 'MIP-decomposition': DecompositionServerPlacer(data.base_stations, data.distances, time_limit=60)
     }
-    run(placers)
\ No newline at end of file
+    run(placers, interchange=FastInterchange(time_budget=30), lower_bound=LagrangianBound(time_limit=30))
\ No newline at end of file
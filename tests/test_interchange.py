@@ -0,0 +1,36 @@
+import random
+
+import numpy as np
+
+from algo.interchange import FastInterchange
+from algo.kmeans import KMeansServerPlacer
+from algo.random import RandomServerPlacer
+from benchmark import synthetic_data
+
+
+def test_interchange_snaps_random_sites_outside_first_n():
+    base_stations, distances = synthetic_data(400)
+    placer = RandomServerPlacer(base_stations, distances)
+    random.seed(0)
+    placer.place_server(200, 20)
+    before = [es.base_station_id for es in placer.edge_servers]
+    assert any(x >= 200 for x in before)
+
+    placer.interchange(FastInterchange())
+
+    sites = [es.base_station_id for es in placer.edge_servers]
+    assert len(set(sites)) == 20 and all(x < 200 for x in sites)
+    assert sorted(bs.id for es in placer.edge_servers for bs in es.assigned_base_stations) == list(range(200))
+    assert np.isfinite(placer.compute_objectives()['latency'])
+
+
+def test_interchange_keeps_reported_off_site_placement():
+    base_stations, distances = synthetic_data(300)
+    placer = KMeansServerPlacer(base_stations, distances)
+    placer.place_server(300, 20)
+    reported = placer.edge_servers
+
+    placer.interchange(FastInterchange())
+
+    assert all(es.base_station_id is None for es in reported)
+    assert len({es.base_station_id for es in placer.edge_servers}) == 20
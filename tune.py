@@ -0,0 +1,41 @@
+import logging
+
+from algo.ga import GAServerPlacer
+from algo.qpso import QPSOServerPlacer
+from algo.tuner import SuccessiveHalvingTuner
+from utils_all import DataUtils
+
+# Search spaces of the metaheuristic settings that used to be edited by hand in main2.py
+SPACES = {
+    'QPSO': (QPSOServerPlacer, {
+        'swarm_size': [20, 30, 50],
+        'beta': (0.5, 1.0),
+        'alpha_delay': (0.2, 0.8),
+        'beta_workload': (0.1, 0.5),
+        'gamma_potential': (0.0, 0.4),
+    }),
+    'GA': (GAServerPlacer, {
+        'population_size': [30, 60, 100],
+        'mutation_rate': (0.05, 0.4),
+        'crossover_rate': (0.6, 1.0),
+    }),
+}
+
+
+def tune(name, n=3000, k=100, num_configs=27, min_budget=5, eta=3, score='latency',
+         results_fpath='results/tuning_{0}.csv'):
+    data = DataUtils('./dataset/bs_all.csv', './dataset/data_all.csv')
+    placer_class, space = SPACES[name]
+    tuner = SuccessiveHalvingTuner(placer_class, data.base_stations, data.distances, space, num_configs=num_configs,
+                                   min_budget=min_budget, eta=eta, score=score, fixed={'seed': 0})
+    results = tuner.tune(n, k)
+    results.to_csv(results_fpath.format(name))
+    print(results.head(10).to_string())
+    print('best {0} settings: {1}'.format(name, tuner.best_config()))
+    return results
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    for name in SPACES:
+        tune(name)
@@ -9,6 +9,8 @@ from functools import wraps
 from math import cos, asin, sqrt
 from typing import List
 
+import numpy as np
+
 from data.base_station import BaseStation
 
 def memorize(filename):
@@ -112,6 +114,24 @@ class DataUtils(object):
         a = 0.5 - cos((lat_b - lat_a) * p) / 2 + cos(lat_a * p) * cos(lat_b * p) * (1 - cos((lng_b - lng_a) * p)) / 2
         return 12742 * asin(sqrt(a))  # 2*R*asin...
 
+    @staticmethod
+    def calc_distances(lat_a, lng_a, lat_b, lng_b):
+        """
+        Vectorized version of calc_distance, arguments are broadcast against each other.
+        
+        :param lat_a: Latitudes A.
+        :param lng_a: Longitudes A.
+        :param lat_b: Latitudes B.
+        :param lng_b: Longitudes B.
+        :return: Distances (km) as ndarray.
+        """
+        p = 0.017453292519943295  # Pi/180
+        lat_a, lng_a = np.asarray(lat_a, dtype=float), np.asarray(lng_a, dtype=float)
+        lat_b, lng_b = np.asarray(lat_b, dtype=float), np.asarray(lng_b, dtype=float)
+        a = 0.5 - np.cos((lat_b - lat_a) * p) / 2 + np.cos(lat_a * p) * np.cos(lat_b * p) * (
+                1 - np.cos((lng_b - lng_a) * p)) / 2
+        return 12742 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
     @memorize('cache_all/distances')
     def distance_between_stations(self) -> List[List[float]]:
         """